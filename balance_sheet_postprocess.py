@@ -0,0 +1,127 @@
+"""
+Balance-sheet post-processing: the plug accounts and reconciled lines computed from the extracted
+Statement of Financial Position (one row per school / file, columns named as in BS_Schema_251017).
+
+add_plug_accounts is the columnar version of the function of the same name in
+extraction_balance_sheet_private_251017.ipynb; tests/test_balance_sheet_postprocess.py checks that the
+two agree column by column on generated school-years (the golden comparison).
+"""
+import numpy as np
+import pandas as pd
+
+# Reconciled line -> (balance-sheet column, notes column): the notes figure wins when both are there and differ
+PAIRS_TO_RECONCILE = {
+    "rou_assets_finance_lease": ["rou_assets_finance_lease_bs", "rou_assets_finance_lease_notes"],
+    "rou_assets_operating_lease": ["rou_assets_operating_lease_bs", "rou_assets_operating_lease_notes"],
+    "finance_lease_liability": ["finance_lease_liability_bs", "finance_lease_liability_notes"],
+    "operating_lease_liability": ["operating_lease_liability_bs", "operating_lease_liability_notes"],
+}
+
+NET_RECEIVABLES_COMPONENTS = [
+    "accounts_receivable",
+    "pledges_receivable",
+    "government_grants_and_other_receivables",
+    "loans_receivable"
+]
+
+ASSET_COMPONENTS = [
+    "cash_and_short_term_investments_unrestricted_and_restricted",
+    "net_receivables",
+    "net_fixed_assets",
+    "long_term_investments_unrestricted_and_restricted",
+    "rou_assets_operating_lease"
+]
+
+LIABILITY_COMPONENTS = [
+    "short_term_debt",
+    "current_portion_finance_lease",
+    "current_portion_long_term_debt",
+    "current_portion_operating_lease",
+    "accounts_payable",
+    "all_deferred_revenue",
+    "long_term_debt",
+    "finance_lease_liability",
+    "operating_lease_liability",
+    "swap_obligation_fmv",
+    "pension_and_opeb_liability"
+]
+
+
+def _filled(df: pd.DataFrame, col: str):
+    """`df[col]` with missing values as 0, or 0 when the column was not extracted at all."""
+    return df[col].fillna(0) if col in df.columns else 0
+
+
+def reconcile_pair(bs: pd.Series, notes: pd.Series) -> pd.Series:
+    """
+    The balance-sheet figure when the notes one is missing or equal to it, the notes figure otherwise
+    (also when only the notes have one).
+    """
+    out = pd.Series(np.where(notes.isna() | (bs == notes), bs, notes), index=bs.index)
+    return out.infer_objects()
+
+
+def distinct_sum(*columns: pd.Series) -> pd.Series:
+    """Row sum of the distinct non-zero values among `columns` (the same figure found twice counts once)."""
+    total = pd.Series(0.0, index=columns[0].index)
+    for i, col in enumerate(columns):
+        new = col != 0
+        for prev in columns[:i]:
+            new &= col != prev
+        total = total + col.where(new, 0)
+    return total
+
+
+def add_plug_accounts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the reconciled and plug columns to `df` (in place, and returns it):
+    lease pairs, net receivables, pension + OPEB, accumulated depreciation / amortization, long-term
+    investments, deferred revenue, long-term debt, net fixed assets, the asset / liability component
+    sums, other_assets_plug, other_liabilities_plug and expendable net assets with donor restrictions.
+    """
+    for new_col, (col1, col2) in PAIRS_TO_RECONCILE.items():
+        df[new_col] = reconcile_pair(df[col1], df[col2])
+
+    # Net receivables: the components plus whatever of all_receivables they leave over
+    components = df[NET_RECEIVABLES_COMPONENTS].fillna(0).sum(axis=1)
+    df["receivables_leftover_calculated"] = df["all_receivables"] - components
+    df["net_receivables"] = components + df["receivables_leftover_calculated"]
+
+    df["pension_and_opeb_liability"] = _filled(df, "pension_liability") + _filled(df, "opeb_liability")
+
+    # Accumulated depreciation and amortization: bs and notes are one figure when equal, added otherwise
+    dep_bs, dep_notes = _filled(df, "accumulated_depreciation_bs"), _filled(df, "accumulated_depreciation_notes")
+    amo_bs, amo_notes = _filled(df, "accumulated_amortization_bs"), _filled(df, "accumulated_amortization_notes")
+    df["accumulated_depreciation"] = (np.where(dep_bs == dep_notes, dep_bs, dep_bs + dep_notes)
+                                      + np.where(amo_bs == amo_notes, amo_bs, amo_bs + amo_notes))
+
+    df["long_term_investments_unrestricted_and_restricted"] = (
+        _filled(df, "long_term_investments") + _filled(df, "cash_surrender_value_life_insurance")
+    )
+
+    # Deferred revenue: the same amount reported under two of the labels counts once.
+    # The squared asset retirement obligation term is the notebook's, kept as is.
+    aro = _filled(df, "asset_retirement_obligations")
+    df["deferred_revenue"] = distinct_sum(
+        *(pd.Series(_filled(df, c), index=df.index)
+          for c in ("deferred_revenue_raw", "student_tuition_and_deposits", "student_credit_balances_and_deposits"))
+    )
+    df["deferred_revenue"] -= aro * aro
+    df["all_deferred_revenue"] -= aro * aro
+
+    long_term_debt = (_filled(df, "long_term_debt_labeled") + _filled(df, "other_long_term_debt_obligations")
+                      + _filled(df, "finance_lease_liability"))
+    df["long_term_debt"] = long_term_debt
+    df["long_term_debt"] = df["long_term_debt"].where(df["long_term_debt"] != 0,
+                                                      _filled(df, "backup_total_long_term_debt"))
+
+    df["net_fixed_assets"] = df["net_fixed_assets_raw"].fillna(0) + df["rou_assets_finance_lease"].fillna(0)
+
+    df["sum_asset_components"] = df[[c for c in ASSET_COMPONENTS if c in df.columns]].sum(axis=1, skipna=True)
+    df["sum_liability_components"] = df[[c for c in LIABILITY_COMPONENTS if c in df.columns]].sum(axis=1, skipna=True)
+    df["other_assets_plug"] = df["total_assets"] - df["sum_asset_components"]
+    df["other_liabilities_plug"] = df["total_liabilities"] - df["sum_liability_components"]
+    df["expendable_net_assets_with_donor_restrictions"] = (
+        df["net_assets_with_donor_restrictions"] - df["perpetual_net_assets_with_donor_restrictions"]
+    )
+    return df
@@ -0,0 +1,169 @@
+"""
+Consensus of repeated extraction runs: one value per (school, metric) out of the rows the runs
+produced for that school, for any statement type (balance sheet, income statement, cash flows, ...).
+
+The rule is safe_mode's, from find_mode_balance_sheet_250926.ipynb:
+  - no value at all: 0
+  - one most frequent value: that value
+  - a tie between values, and exactly three distinct values:
+      all three within AGREE_ALL (1%) of their average: the average;
+      else the first pair (in ascending order) within AGREE_PAIR (5%) of its mean: that mean
+  - any other tie: the school's last row
+
+consensus() evaluates it for every numeric column at once, on a (school x row x metric) array:
+value counts come from comparing the rows pairwise, the three distinct values from a sort. Other
+columns (file names, labels) go through safe_mode itself. tests/test_consensus.py compares the two on
+generated runs (the golden comparison).
+"""
+import itertools
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+AGREE_ALL = 0.01       # three distinct values within this share of their average count as one
+AGREE_PAIR = 0.05      # else two of them within this share of their mean do
+CHUNK_CELLS = 1 << 24  # bound on the (schools x rows x rows x metrics) comparison block
+
+
+def safe_mode(x: pd.Series):
+    """The notebook's per-(school, column) rule (reference for consensus, and used for non-numeric columns)."""
+    counts = x.value_counts(dropna=True)
+    if counts.empty:
+        return 0
+
+    # Case 1: No unique mode (tie in counts)
+    if len(counts) > 1 and counts.iloc[0] == counts.iloc[1:].max():
+        unique_vals = np.sort(x.dropna().unique())
+
+        # --- Rule A: All 3 values within 1% of their average ---
+        if len(unique_vals) == 3:
+            avg_all = np.mean(unique_vals)
+            diffs = np.abs(unique_vals - avg_all) / avg_all
+            if (diffs < AGREE_ALL).all():
+                return avg_all
+
+            # --- Rule B: Any 2 of 3 values within 5% of each other ---
+            for a, b in itertools.combinations(unique_vals, 2):  # all (n choose 2) pairs
+                if abs(a - b) / np.mean([a, b]) < AGREE_PAIR:
+                    return np.mean([a, b])
+
+        # --- Rule C: if no mode is found, return the latest one
+        return x.iloc[-1]
+
+    return counts.idxmax()
+
+
+def _consensus_block(values: np.ndarray, n_rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """consensus_array on one block of schools."""
+    g, r, m = values.shape
+    rows = np.arange(r)
+    present = ~np.isnan(values) & (rows[None, :, None] < n_rows[:, None, None])
+    same = (values[:, :, None, :] == values[:, None, :, :]) & present[:, :, None, :] & present[:, None, :, :]
+    counts = same.sum(axis=2)                                   # occurrences of row i's value, (g, r, m)
+    top = counts.max(axis=1)                                    # (g, m)
+    at_top = counts == top[:, None, :]
+    tie = at_top.sum(axis=1) > top                              # more than one value reaches the top count
+    mode = np.take_along_axis(values, at_top.argmax(axis=1)[:, None, :], axis=1)[:, 0, :]
+
+    # Distinct values: rows whose value no earlier row had
+    earlier = np.tril(np.ones((r, r), dtype=bool), k=-1)        # earlier[i, j]: j < i
+    first = present & ~(same & earlier[None, :, :, None]).any(axis=2)
+    n_unique = first.sum(axis=1)
+    three = np.sort(np.where(first, values, np.nan), axis=1)[:, :3, :] if r >= 3 else None
+
+    last = values[np.arange(g), np.maximum(n_rows - 1, 0), :]
+    out = np.where(top == 0, 0.0, np.where(tie, last, mode))
+    averaged = np.zeros((g, m), dtype=bool)
+    candidates = tie & (n_unique == 3)
+    if three is not None:
+        u0, u1, u2 = three[:, 0, :], three[:, 1, :], three[:, 2, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg = (u0 + u1 + u2) / 3
+            rule_a = ((np.abs(u0 - avg) / avg < AGREE_ALL) & (np.abs(u1 - avg) / avg < AGREE_ALL)
+                      & (np.abs(u2 - avg) / avg < AGREE_ALL))
+            pair_result = np.full((g, m), np.nan)
+            pair_hit = np.zeros((g, m), dtype=bool)
+            for a, b in ((u0, u1), (u0, u2), (u1, u2)):
+                mean = (a + b) / 2
+                hit = ~pair_hit & (np.abs(a - b) / mean < AGREE_PAIR)
+                pair_result = np.where(hit, mean, pair_result)
+                pair_hit |= hit
+        out = np.where(candidates & rule_a, avg, np.where(candidates & ~rule_a & pair_hit, pair_result, out))
+        averaged = candidates & (rule_a | pair_hit)
+    return out, averaged, candidates
+
+
+def consensus_array(values: np.ndarray, n_rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    safe_mode over a (school x row x metric) float array, NaN for missing values. `n_rows[s]` is the
+    number of rows school s really has (rows past it are padding).
+
+    Returns the (school x metric) consensus, the mask of cells where it is an average of distinct
+    values (rules A/B), and the mask of cells where rules A/B were tried (a tie, three distinct values).
+    """
+    g, r, m = values.shape
+    out = np.empty((g, m))
+    averaged = np.empty((g, m), dtype=bool)
+    three_way = np.empty((g, m), dtype=bool)
+    step = max(1, CHUNK_CELLS // max(1, r * r * m))
+    for start in range(0, g, step):
+        block = slice(start, start + step)
+        out[block], averaged[block], three_way[block] = _consensus_block(values[block], n_rows[block])
+    return out, averaged, three_way
+
+
+def to_array(df: pd.DataFrame, by: str, columns: List[str]) -> Tuple[np.ndarray, np.ndarray, pd.Index]:
+    """
+    (school x row x metric) array of `columns`, rows in their order in `df`, with rows per school and
+    the schools. Non-numeric columns are given as their factorize codes (NaN for missing values).
+    """
+    codes, groups = pd.factorize(df[by], sort=True, use_na_sentinel=False)
+    n_rows = np.bincount(codes, minlength=len(groups))
+    position = df.groupby(codes).cumcount().to_numpy()
+    values = np.full((len(groups), max(n_rows.max(initial=0), 1), len(columns)), np.nan)
+    for j, c in enumerate(columns):
+        if _is_numeric(df[c]):
+            values[codes, position, j] = df[c].to_numpy(dtype=float, na_value=np.nan)
+        else:
+            labels = pd.factorize(df[c])[0].astype(float)
+            labels[labels < 0] = np.nan
+            values[codes, position, j] = labels
+    return values, n_rows, pd.Index(groups, name=by)
+
+
+def _is_numeric(s: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+
+def consensus(df: pd.DataFrame, by: str = "school") -> pd.DataFrame:
+    """
+    One row per `by` value with the safe_mode consensus of every other column, as
+    `df.groupby([by], dropna=False).agg(safe_mode)` returns it (same index, columns and dtypes).
+    """
+    columns = [c for c in df.columns if c != by]
+    values, n_rows, groups = to_array(df, by, columns)
+    result, averaged, three_way = consensus_array(values, n_rows)
+    no_value = np.isnan(values).all(axis=(0, 1))
+    group_codes = None
+    out = {}
+    for i, c in enumerate(columns):
+        if _is_numeric(df[c]):
+            # As agg infers them: integer columns stay integers unless a consensus is an average, and a
+            # column without a single value is the integer 0 everywhere
+            out[c] = pd.Series(result[:, i], index=groups)
+            if pd.api.types.is_integer_dtype(df[c]) and not averaged[:, i].any():
+                out[c] = out[c].astype(df[c].dtype)
+            elif no_value[i]:
+                out[c] = out[c].astype("int64")
+            continue
+        # Labels: the consensus of their codes, except where rules A/B need the values themselves
+        uniques = pd.factorize(df[c])[1]
+        picked = [0 if code == 0 and empty else (np.nan if np.isnan(code) else uniques[int(code)])
+                  for code, empty in zip(result[:, i], np.isnan(values[:, :, i]).all(axis=1))]
+        for g in np.flatnonzero(three_way[:, i]):
+            if group_codes is None:
+                group_codes = pd.factorize(df[by], sort=True, use_na_sentinel=False)[0]
+            picked[g] = safe_mode(df[c].iloc[np.flatnonzero(group_codes == g)])
+        out[c] = pd.Series(picked, index=groups, dtype=object).infer_objects()
+    return pd.DataFrame(out, index=groups, columns=columns)
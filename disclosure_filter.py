@@ -0,0 +1,102 @@
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Subgroups (EMMA continuing-disclosure categories) whose documents are kept
+APPROVED_SUBGROUPS = [
+    "Annual Financial Information and Operating Data",
+    "Audited Financial Statements or ACFR",
+    "Continuing Disclosure Undertaking",
+    "Other Financial / Operating Data",
+    "Quarterly / Monthly Financial Information"
+]
+SUBGROUP_THRESHOLD = 0.8   # minimum SequenceMatcher ratio to an approved subgroup
+
+
+class SubgroupMatcher:
+    """
+    Whether subgroup names are at least `threshold` similar (SequenceMatcher ratio, case-insensitive)
+    to one of the approved categories.
+
+    Each distinct name is scored once and remembered, so a column of hundreds of thousands of rows costs
+    one lookup per row. Candidates are pruned with the ratio's own upper bounds before the full
+    comparison: the length bound 2*min(len)/(len+len) and SequenceMatcher.quick_ratio (character
+    multiset overlap). Neither bound can reject a pair whose real ratio reaches the threshold, so the
+    result is the same as comparing every name against every category.
+    """
+
+    def __init__(self, approved: List[str] = APPROVED_SUBGROUPS, threshold: float = SUBGROUP_THRESHOLD):
+        self.threshold = threshold
+        self.approved = [a.lower() for a in approved]
+        self._matchers = [SequenceMatcher(None, "", a) for a in self.approved]  # caches b's index
+        self._known: Dict[str, bool] = {}
+
+    def _is_similar(self, name: str) -> bool:
+        n = len(name)
+        for cand, sm in zip(self.approved, self._matchers):
+            m = len(cand)
+            if 2.0 * min(n, m) / (n + m) < self.threshold:
+                continue
+            sm.set_seq1(name)
+            if sm.quick_ratio() >= self.threshold and sm.ratio() >= self.threshold:
+                return True
+        return False
+
+    def is_similar(self, value) -> bool:
+        if not isinstance(value, str) or not value.strip():
+            return False
+        name = value.lower()
+        hit = self._known.get(name)
+        if hit is None:
+            hit = self._known[name] = self._is_similar(name)
+        return hit
+
+    def mask(self, subgroups: pd.Series) -> pd.Series:
+        """Boolean mask over `subgroups`, computed on its distinct values."""
+        codes, uniques = pd.factorize(subgroups, use_na_sentinel=True)
+        hits = np.fromiter((self.is_similar(u) for u in uniques), dtype=bool, count=len(uniques))
+        return pd.Series(np.append(hits, False)[codes], index=subgroups.index)
+
+
+_DEFAULT_MATCHER: Optional[SubgroupMatcher] = None
+
+
+def clean_disclosures(df: pd.DataFrame, threshold: float = SUBGROUP_THRESHOLD,
+                      matcher: Optional[SubgroupMatcher] = None) -> pd.DataFrame:
+    """
+    Cleans a disclosures DataFrame by:
+      1. Dropping rows where 'subgroup' is empty and the pdf_url appears >1 times.
+      2. Dropping rows where 'posted_date' == 'Details' and the pdf_url appears >1 times.
+      3. Deduplicating by pdf_url, keeping the row with the richest metadata.
+      4. Keeping only rows whose 'subgroup' is at least `threshold` similar to one of the approved categories.
+    Keeps and drops the same rows, in the same order, as the row-by-row version of the scraper notebooks.
+    """
+    global _DEFAULT_MATCHER
+    if matcher is None:
+        if _DEFAULT_MATCHER is None or _DEFAULT_MATCHER.threshold != threshold:
+            _DEFAULT_MATCHER = SubgroupMatcher(threshold=threshold)
+        matcher = _DEFAULT_MATCHER
+
+    # 1-3) Rows with an empty subgroup or a 'Details' posted date only survive if their URL is unique
+    dup_url = df['pdf_url'].duplicated(keep=False) & df['pdf_url'].notna()
+    empty_sub = df['subgroup'].fillna('').str.strip() == ''
+    details = df['posted_date'].fillna('') == 'Details'
+    df2 = df[~(dup_url & (empty_sub | details))]
+
+    # 4) Deduplicate: prefer rows that still have subgroup/dates. The score counts truthy cells, as
+    # bool() does (astype(bool) on the object columns); the sort is the one the notebook used, so ties
+    # between equally rich rows resolve to the same row.
+    score = (df2['subgroup'].astype(bool).astype(int) + df2['period_date'].astype(bool).astype(int)
+             + df2['posted_date'].astype(bool).astype(int))
+    df2 = (
+        df2
+        .assign(__score=score)
+        .sort_values('__score', ascending=False)
+        .drop_duplicates(subset=['pdf_url'], keep='first')
+        .drop(columns='__score')
+    )
+
+    # 5) Fuzzy-filter by subgroup similarity
+    return df2[matcher.mask(df2['subgroup']).to_numpy()].reset_index(drop=True)
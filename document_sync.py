@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from extraction_cache import file_sha256
+from pdf_blob_store import BlobStore
+from pdf_downloader import DOWNLOAD_WORKERS, EXISTS, FAILED, TMP_DIR, download_pdfs, target_path
+
+# Default location of the manifest, next to the scraper's CSVs
+MANIFEST_PATH = "document_manifest.sqlite"
+
+MANIFEST_COLUMNS = ["pdf_url", "credit", "document_name", "path", "bytes", "sha256", "posted_date", "downloaded_at"]
+
+# Sync statuses (on top of the pdf_downloader ones for rows that were fetched)
+SYNCED, ADOPTED = "synced", "adopted"
+
+
+class DocumentManifest:
+    """
+    SQLite manifest of synced EMMA documents: pdf_url -> local path, size, SHA-256, posted_date, download time.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " pdf_url TEXT PRIMARY KEY, credit TEXT, document_name TEXT, path TEXT NOT NULL,"
+                " bytes INTEGER NOT NULL, sha256 TEXT NOT NULL, posted_date TEXT, downloaded_at REAL)"
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def entries(self) -> pd.DataFrame:
+        """One row per synced document."""
+        return pd.read_sql_query(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM documents", self.conn)
+
+    def lookup(self) -> Dict[str, dict]:
+        """pdf_url -> manifest entry."""
+        return {row["pdf_url"]: row for row in self.entries().to_dict("records")}
+
+    def record(self, entries: pd.DataFrame) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO documents ({', '.join(MANIFEST_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(MANIFEST_COLUMNS))})",
+                entries[MANIFEST_COLUMNS].itertuples(index=False, name=None),
+            )
+
+    def by_sha256(self, sha256: str) -> pd.DataFrame:
+        """Every synced URL whose file has this content hash (the same PDF posted under several URLs)."""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM documents WHERE sha256 = ?", self.conn, params=[sha256]
+        )
+
+
+def _text(value) -> Optional[str]:
+    return None if pd.isna(value) else str(value)
+
+
+def _is_current(entry: Optional[dict], target: Path, posted_date: Optional[str], verify: str) -> bool:
+    """Whether the manifest entry still describes the file on disk and the posting in the document list."""
+    if entry is None or entry["path"] != str(target) or entry["posted_date"] != posted_date:
+        return False
+    try:
+        if os.path.getsize(target) != entry["bytes"]:
+            return False
+    except OSError:
+        return False
+    return verify != "hash" or file_sha256(str(target)) == entry["sha256"]
+
+
+def sync_documents(df: pd.DataFrame,
+                   root_dir: Path,
+                   manifest: DocumentManifest,
+                   workers: int = DOWNLOAD_WORKERS,
+                   verify: str = "size",
+                   adopt_existing: bool = True,
+                   download_dir: Path = TMP_DIR,
+                   failed_log_path: Optional[str] = None,
+                   blob_store: Optional[BlobStore] = None,
+                   **download_kwargs) -> pd.DataFrame:
+    """
+    Brings <root_dir>/<CREDIT>/ in line with the document list `df` (pdf_url, CREDIT, document_name, posted_date).
+
+    A row is skipped when the manifest has its URL with the same path and posted_date and the file on
+    disk still has the recorded size (`verify="size"`, a stat call) or hash (`verify="hash"`). Files from
+    runs before the manifest existed are hashed and recorded without downloading (`adopt_existing`).
+    Everything else (new URLs, re-posted documents, missing or truncated files) is downloaded with
+    pdf_downloader.download_pdfs and recorded with its SHA-256. With a `blob_store`, downloaded and
+    adopted files are then linked to its copy of the same content (pdf_blob_store).
+
+    Returns one row per document: pdf_url, path, status (synced / adopted / http / browser / failed), sha256.
+    """
+    rows = df.dropna(subset=["CREDIT", "pdf_url", "document_name"]).drop_duplicates("pdf_url")
+    known = manifest.lookup()
+    now = time.time()
+    done, adopted, todo, posted_by_url = [], [], [], {}
+    for row in rows.itertuples(index=False):
+        target = target_path(root_dir, row.CREDIT, row.document_name, row.pdf_url)
+        posted = _text(getattr(row, "posted_date", None))
+        entry = known.get(row.pdf_url)
+        if _is_current(entry, target, posted, verify):
+            done.append({"pdf_url": row.pdf_url, "path": str(target), "status": SYNCED, "sha256": entry["sha256"]})
+        elif adopt_existing and entry is None and target.exists():
+            adopted.append({"pdf_url": row.pdf_url, "credit": row.CREDIT, "document_name": row.document_name,
+                            "path": str(target), "bytes": target.stat().st_size, "sha256": file_sha256(str(target)),
+                            "posted_date": posted, "downloaded_at": target.stat().st_mtime})
+        else:
+            todo.append(row)
+            posted_by_url[row.pdf_url] = posted
+    print(f"{len(done)} documents in sync, {len(adopted)} adopted from disk, {len(todo)} to download")
+
+    if adopted:
+        manifest.record(pd.DataFrame(adopted))
+        done += [{"pdf_url": a["pdf_url"], "path": a["path"], "status": ADOPTED, "sha256": a["sha256"]} for a in adopted]
+
+    if todo:
+        todo_df = pd.DataFrame(todo, columns=rows.columns)
+        results = download_pdfs(todo_df, root_dir, workers=workers, download_dir=download_dir,
+                                failed_log_path=failed_log_path, skip_existing=False, **download_kwargs)
+        fetched = results[~results["status"].isin([FAILED, EXISTS])].copy()
+        fetched["sha256"] = [file_sha256(p) for p in fetched["path"]]
+        fetched["posted_date"] = fetched["pdf_url"].map(posted_by_url)
+        fetched["downloaded_at"] = now
+        manifest.record(fetched)
+        results = results.merge(fetched[["pdf_url", "sha256"]], on="pdf_url", how="left")
+        done += results[["pdf_url", "path", "status", "sha256"]].to_dict("records")
+
+    out = pd.DataFrame(done, columns=["pdf_url", "path", "status", "sha256"])
+    if blob_store is not None:
+        new = out[out["status"] != SYNCED].dropna(subset=["sha256"])
+        for path, sha in zip(new["path"], new["sha256"]):
+            try:
+                blob_store.add(path, sha)
+            except OSError as e:
+                print(f"Jump: {path}: {e}")
+    return out
@@ -0,0 +1,227 @@
+"""
+Pre-download triage of the EMMA disclosure list: how likely each row is to end up "Other" in the flagger
+(no financial statements, no enrollment), judged from its metadata alone, before anything is downloaded.
+
+The model is a small L2-regularised logistic regression over the row's metadata:
+  - words of `document_name` and `subgroup`
+  - the file size EMMA prints in the name ("(298 KB)"), in log2 buckets
+  - the "DocumentN" part number of multi-part filings
+  - the fiscal-year-end month of `period_date` (or of "for the year ended MM/DD/YYYY" in the name), the
+    same whether the date is ISO (the filtered list), MM/DD/YYYY (the full list) or slugified (file names)
+It is trained on a flagger output (flags_all_steps_withschool.csv: one row per downloaded document, its
+file name being the slugified document_name) and calibrated with cross-validated predictions: rows are only
+deferred above the lowest probability at which no held-out FS / Enrollment document would have been
+deferred. When no held-out Other document scores above that threshold (the labelled set can't separate
+the classes yet) nothing is deferred at all, so triage only starts skipping once the flags support it.
+"""
+import math
+import os
+import re
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+FLAGS_PATH = "flags_all_steps_withschool.csv"
+LABEL_COLUMN = "Other_3"     # flagger verdict after all three steps
+L2 = 1.0                     # ridge penalty of the logistic regression
+ITERATIONS = 2000
+LEARNING_RATE = 0.5
+KEEP_RECALL = 1.0            # share of held-out relevant documents the defer threshold must keep
+FOLDS = 10                   # cross-validation folds of the calibration
+
+# Decisions
+DOWNLOAD, DEFER, SKIP = "download", "defer", "skip"
+
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)[\s_(]*(KB|MB|GB)(?![A-Za-z])", re.I)
+_PART = re.compile(r"document\s*_?(\d+)", re.I)
+_DATE = r"(?<!\d)(?:(\d{4})-(\d{1,2})-\d{1,2}|(\d{1,2})[/_.-](\d{1,2})[/_.-](?:\d{4}|\d{2}))(?!\d)"
+_ANY_DATE = re.compile(_DATE)
+_YEAR_END = re.compile(r"end(?:ed|ing)[\s_]+" + _DATE, re.I)
+_STOPWORDS = {"for", "the", "and", "year", "ended", "ending", "fiscal", "june", "document"}
+_KB = {"kb": 1, "mb": 1 << 10, "gb": 1 << 20}
+
+
+def size_hint_kb(name: str) -> Optional[float]:
+    """File size EMMA appends to document names ("... (298 KB)", slugified "..._298_KB_"), in KB."""
+    m = _SIZE.search(name) if isinstance(name, str) else None
+    return float(m.group(1)) * _KB[m.group(2).lower()] if m else None
+
+
+def _month(m: Optional[re.Match]) -> Optional[int]:
+    if m is None:
+        return None
+    month = int(m.group(2) or m.group(3))
+    return month if 1 <= month <= 12 else None
+
+
+def year_end_month(document_name: Optional[str], period_date: Optional[str] = None) -> Optional[int]:
+    """
+    Fiscal-year-end month of a disclosure row: that of `period_date` (YYYY-MM-DD or MM/DD/YYYY), else of
+    the date after "ended" / "ending" in the name, else of the first date in the name.
+    """
+    if isinstance(period_date, str):
+        month = _month(_ANY_DATE.search(period_date))
+        if month is not None:
+            return month
+    name = document_name if isinstance(document_name, str) else ""
+    return _month(_YEAR_END.search(name) or _ANY_DATE.search(name))
+
+
+def _words(text: str, prefix: str) -> Set[str]:
+    return {prefix + w for w in re.findall(r"[a-z]{3,}", text.lower()) if w not in _STOPWORDS}
+
+
+def triage_features(document_name: str, subgroup: Optional[str] = None, period_date: Optional[str] = None) -> Set[str]:
+    """Feature names of one disclosure row (document names may be raw or slugified file names)."""
+    name = document_name if isinstance(document_name, str) else ""
+    feats = _words(_SIZE.sub(" ", name), "w:")
+    if isinstance(subgroup, str) and subgroup.strip():
+        feats |= _words(subgroup, "sg:")
+    kb = size_hint_kb(name)
+    feats.add(f"size:{min(int(math.log2(max(kb, 1))), 14)}" if kb is not None else "size:none")
+    part = _PART.search(name)
+    feats.add(f"part:{min(int(part.group(1)), 3) if part else 0}")
+    month = year_end_month(name, period_date)
+    if month is not None:
+        feats.add(f"fye:{month}")
+    return feats
+
+
+class TriageModel(NamedTuple):
+    vocabulary: List[str]
+    weights: np.ndarray
+    bias: float
+
+
+def _matrix(rows: List[Set[str]], vocabulary: List[str]) -> np.ndarray:
+    index = {f: i for i, f in enumerate(vocabulary)}
+    X = np.zeros((len(rows), len(vocabulary)))
+    for r, feats in enumerate(rows):
+        for f in feats:
+            i = index.get(f)
+            if i is not None:
+                X[r, i] = 1.0
+    return X
+
+
+def fit(rows: List[Set[str]], labels: Iterable[bool], l2: float = L2) -> TriageModel:
+    """Logistic regression of P(Other) by batch gradient descent (the sets are a few thousand rows at most)."""
+    y = np.asarray(list(labels), dtype=float)
+    vocabulary = sorted(set().union(*rows)) if rows else []
+    X = _matrix(rows, vocabulary)
+    w, b = np.zeros(len(vocabulary)), 0.0
+    for _ in range(ITERATIONS):
+        g = 1 / (1 + np.exp(-(X @ w + b))) - y
+        w -= LEARNING_RATE * (X.T @ g + l2 * w) / len(y)
+        b -= LEARNING_RATE * g.mean()
+    return TriageModel(vocabulary, w, b)
+
+
+def predict(model: TriageModel, rows: List[Set[str]]) -> np.ndarray:
+    return 1 / (1 + np.exp(-(_matrix(rows, model.vocabulary) @ model.weights + model.bias)))
+
+
+def flag_training_rows(flags_path: str = FLAGS_PATH, disclosure_lists: Iterable[str] = (),
+                       label_column: str = LABEL_COLUMN) -> pd.DataFrame:
+    """
+    Labelled rows from a flagger output: document_name (the file name), subgroup / period_date when the
+    document can be found in one of the `disclosure_lists` CSVs (same CREDIT and slugified name), label.
+    """
+    from pdf_downloader import slugify
+
+    flags = pd.read_csv(flags_path)
+    out = pd.DataFrame({
+        "school": flags["school"],
+        "file": flags["document"].map(lambda p: os.path.splitext(os.path.basename(p))[0]),
+        "label": flags[label_column].astype(bool),
+    })
+    meta = []
+    for path in disclosure_lists:
+        d = pd.read_csv(path, dtype=str).dropna(subset=["document_name", "CREDIT"])
+        meta.append(pd.DataFrame({"school": d["CREDIT"].map(slugify), "file": d["document_name"].map(slugify),
+                                  "subgroup": d["subgroup"], "period_date": d["period_date"]}))
+    if meta:
+        out = out.merge(pd.concat(meta).drop_duplicates(["school", "file"]), on=["school", "file"], how="left")
+    else:
+        out["subgroup"] = out["period_date"] = None
+    return out.rename(columns={"file": "document_name"})
+
+
+class Calibration(NamedTuple):
+    threshold: float          # P(Other) at or above which rows are deferred (inf: never)
+    deferred_other: int       # held-out Other documents the threshold would have deferred
+    other: int
+    deferred_relevant: int    # held-out FS / Enrollment documents it would have deferred
+    relevant: int
+
+
+def calibrate(rows: List[Set[str]], labels: List[bool], keep_recall: float = KEEP_RECALL,
+              l2: float = L2, folds: int = FOLDS) -> Calibration:
+    """Cross-validated P(Other) of every labelled row, and the lowest threshold keeping `keep_recall` of the relevant ones."""
+    y = np.asarray(labels, dtype=bool)
+    fold = np.arange(len(rows)) % folds
+    held_out = np.zeros(len(rows))
+    for k in range(min(folds, len(rows))):
+        test = np.flatnonzero(fold == k)
+        train = np.flatnonzero(fold != k)
+        model = fit([rows[i] for i in train], y[train], l2)
+        held_out[test] = predict(model, [rows[i] for i in test])
+    relevant = np.sort(held_out[~y])
+    if len(relevant) == 0:
+        return Calibration(math.inf, 0, int(y.sum()), 0, 0)
+    allowed = int(math.floor((1 - keep_recall) * len(relevant)))
+    # strictly above the (allowed+1)-th highest relevant score
+    threshold = float(np.nextafter(relevant[len(relevant) - 1 - allowed], np.inf))
+    if threshold > 1 or not (held_out[y] >= threshold).any():
+        # A threshold that would not have caught a single held-out Other document is no evidence
+        threshold = math.inf
+    return Calibration(threshold, int((held_out[y] >= threshold).sum()), int(y.sum()),
+                       int((held_out[~y] >= threshold).sum()), int((~y).sum()))
+
+
+class DocumentTriage:
+    """
+    P(Other) for disclosure rows, trained on a flagger output. Rows at or above the calibrated threshold
+    are deferred (downloaded later, if at all); rows at or above `skip_threshold` are skipped outright.
+
+        triage = DocumentTriage.from_flags("flags_all_steps_withschool.csv", ["disclosure_document_list_all.csv"])
+        df = triage.triage(df_docs)
+        to_download = df[df["triage"] == "download"]
+    """
+
+    def __init__(self, model: TriageModel, calibration: Calibration, skip_threshold: float = math.inf):
+        self.model = model
+        self.calibration = calibration
+        self.skip_threshold = skip_threshold
+
+    @classmethod
+    def from_flags(cls, flags_path: str = FLAGS_PATH, disclosure_lists: Iterable[str] = (),
+                   label_column: str = LABEL_COLUMN, keep_recall: float = KEEP_RECALL,
+                   skip_threshold: float = math.inf) -> "DocumentTriage":
+        train = flag_training_rows(flags_path, disclosure_lists, label_column)
+        rows = [triage_features(r.document_name, r.subgroup, r.period_date) for r in train.itertuples(index=False)]
+        labels = train["label"].tolist()
+        calibration = calibrate(rows, labels, keep_recall)
+        print(f"Triage calibrated on {len(rows)} flagged documents: defer at P(Other) >= {calibration.threshold:.3f} "
+              f"(held out: {calibration.deferred_other}/{calibration.other} Other and "
+              f"{calibration.deferred_relevant}/{calibration.relevant} relevant documents deferred)")
+        return cls(fit(rows, labels), calibration, max(skip_threshold, calibration.threshold))
+
+    def p_other(self, df: pd.DataFrame) -> np.ndarray:
+        rows = [triage_features(r.get("document_name"), r.get("subgroup"), r.get("period_date"))
+                for r in df.to_dict("records")]
+        return predict(self.model, rows) if rows else np.zeros(0)
+
+    def triage(self, df: pd.DataFrame) -> pd.DataFrame:
+        """`df` with p_other, size_kb (the size hint) and triage (download / defer / skip) columns."""
+        out = df.copy()
+        p = self.p_other(df)
+        out["p_other"] = p
+        out["size_kb"] = out["document_name"].map(size_hint_kb)
+        out["triage"] = np.where(p >= self.skip_threshold, SKIP,
+                                 np.where(p >= self.calibration.threshold, DEFER, DOWNLOAD))
+        deferred = out[out["triage"] != DOWNLOAD]
+        print(f"Triage: {len(out) - len(deferred)} of {len(out)} documents to download, "
+              f"{len(deferred)} deferred/skipped (~{deferred['size_kb'].sum() / 1024:.1f} MB)")
+        return out
@@ -0,0 +1,343 @@
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from selenium import webdriver
+from selenium.common.exceptions import (StaleElementReferenceException, TimeoutException,
+                                        WebDriverException)
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from tqdm import tqdm
+
+from rate_limiter import BASE_DELAY, MAX_DELAY, AdaptiveRateLimiter
+
+EMMA_URL = "https://emma.msrb.org/"
+CRAWL_WORKERS = 4      # independent Chrome instances
+CUSIP_RETRIES = 2      # extra attempts per CUSIP before it is logged as failed
+RECORD_COLUMNS = ["CUSIP", "subgroup", "document_name", "pdf_url", "period_date", "posted_date"]
+
+
+def setup_crawl_browser(headless: bool = False):
+    chrome_opts = Options()
+    if headless:
+        chrome_opts.add_argument("--headless=new")
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-gpu")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(options=chrome_opts)
+
+
+def handle_cookie_consent(driver):
+    try:
+        accept_button = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.ID, "ctl00_mainContentArea_disclaimerContent_yesButton"))
+        )
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", accept_button)
+        time.sleep(0.3)
+        accept_button.click()
+        print("Clicked 'Accept' button")
+        time.sleep(0.5)
+        body = driver.find_element(By.TAG_NAME, "body")
+        ActionChains(driver).move_to_element_with_offset(body, 0, 0).click().perform()
+        print("Performed dummy click")
+    except TimeoutException:
+        print("No cookie banner found")
+    except Exception as e:
+        print(f"Cookie error: {e}")
+
+
+def click_disclosure_tab_with_retry(driver, retries=3):
+    for attempt in range(retries):
+        try:
+            disclosure_tab = WebDriverWait(driver, 15).until(
+                EC.presence_of_element_located((By.XPATH, '//a[@href="#tabDisclosureDocuments"]'))
+            )
+            driver.execute_script('arguments[0].scrollIntoView({block: "center"});', disclosure_tab)
+            time.sleep(0.4)
+            driver.execute_script("arguments[0].click();", disclosure_tab)
+            return
+        except StaleElementReferenceException:
+            print(f"Attempt {attempt + 1}: Stale tab. Retrying...")
+            time.sleep(1)
+    raise Exception("Could not click Disclosure tab")
+
+
+def extract_tooltip_pdfs(driver):
+    return tooltip_pdfs(driver.page_source)
+
+
+def tooltip_pdfs(page_html: str):
+    """PDF links hidden in the help tooltips of a security page (not part of the disclosure table)."""
+    soup = BeautifulSoup(page_html, "html.parser")
+    results = []
+    for tooltip in soup.select("a.ihpQtipHelp.rtTip[help]"):
+        help_html = tooltip.get("help")
+        section_name = tooltip.get_text(strip=True)
+        if not help_html:
+            continue
+        inner_soup = BeautifulSoup(help_html, "html.parser")
+        for a in inner_soup.find_all("a"):
+            href = a.get("href")
+            doc_text = a.text.strip()
+            if href and href.endswith(".pdf"):
+                full_url = f"https://emma.msrb.org{href}" if not href.startswith("http") else href
+                combined_name = f"{section_name} - {doc_text}"
+                results.append({
+                    "document_name": combined_name,
+                    "pdf_url": full_url
+                })
+    return results
+
+
+def scrape_cusip(driver, c: str, cookie_handled: bool) -> List[dict]:
+    """
+    Disclosure document rows of one CUSIP: search, accept the terms (first search of a browser only),
+    open the Disclosure tab, load the "All" date range and harvest the PDF links and tooltip PDFs.
+    """
+    records = []
+    # 1) Search
+    box = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "quickSearchText"))
+    )
+    box.clear(); box.send_keys(c); box.send_keys(Keys.RETURN)
+
+    # 2) Cookies/Terms
+    if not cookie_handled:
+        handle_cookie_consent(driver)
+
+    # 3) Click Disclosure tab
+    WebDriverWait(driver, 15).until(
+        EC.presence_of_element_located((By.XPATH, '//ul[contains(@class,"ui-tabs-nav")]'))
+    )
+    click_disclosure_tab_with_retry(driver)
+    WebDriverWait(driver, 15).until(
+        EC.presence_of_element_located((By.ID, "tabDisclosureDocuments"))
+    )
+
+    # 4) Select “All” and click Search to load historic docs
+    try:
+        all_radio = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((
+                By.CSS_SELECTOR,
+                'input[name="Filter.SelectedPredefinedDateRange"][value="All"]'
+            ))
+        )
+        driver.execute_script("arguments[0].scrollIntoView(true);", all_radio)
+        time.sleep(0.2)
+        if not all_radio.is_selected():
+            all_radio.click()
+
+        search_link = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.LINK_TEXT, "Search"))
+        )
+        search_link.click()
+
+        # wait for oldest year (e.g. 2016) to appear
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((
+                By.XPATH,
+                "//div[@id='tabDisclosureDocuments']//td[text()='06/30/2016']"
+            ))
+        )
+    except Exception:
+        pass
+
+    # 5) Grab _all_ PDF links in this panel
+    pdf_links = driver.find_elements(
+        By.XPATH,
+        "//div[@id='tabDisclosureDocuments']//a[contains(@href,'.pdf')]"
+    )
+
+    for link in pdf_links:
+        try:
+            name = link.text.strip()
+            href = link.get_attribute("href")
+            url = href if href.startswith("http") else f"https://emma.msrb.org{href}"
+
+            # find its row
+            row = link.find_element(By.XPATH, "./ancestor::tr[1]")
+            cols = row.find_elements(By.TAG_NAME, "td")
+
+            # period / posted
+            if len(cols) == 2:
+                # Official Statements table
+                period = ""
+                posted = cols[1].text.strip()
+            else:
+                period = cols[1].text.strip() if len(cols) > 1 else ""
+                posted = cols[2].text.strip() if len(cols) > 2 else ""
+
+            # subgroup header (groupRow) if it exists
+            subgroup = ""
+            try:
+                subgroup = row.find_element(
+                    By.XPATH,
+                    "preceding-sibling::tr[contains(@class,'groupRow')][1]/th"
+                ).text.strip()
+            except Exception:
+                pass
+
+            records.append({
+                "CUSIP": c,
+                "subgroup": subgroup,
+                "document_name": name,
+                "pdf_url": url,
+                "period_date": period,
+                "posted_date": posted
+            })
+        except StaleElementReferenceException:
+            continue
+
+    # 6) hidden tooltip PDFs
+    for pdf in extract_tooltip_pdfs(driver):
+        records.append({
+            "CUSIP": c,
+            "subgroup": "",
+            "document_name": pdf["document_name"],
+            "pdf_url": pdf["pdf_url"],
+            "period_date": "",
+            "posted_date": ""
+        })
+    return records
+
+
+class _CrawlWorker(threading.Thread):
+    """One browser with its own cookie state; takes CUSIPs from the shared queue until it is empty."""
+
+    def __init__(self, wid: int, jobs: "queue.Queue", make_driver: Callable[[], object], retries: int,
+                 results: Dict[str, List[dict]], failures: List[dict], progress: tqdm, lock: threading.Lock,
+                 base_url: str = EMMA_URL, limiter: Optional[AdaptiveRateLimiter] = None,
+                 done_by_worker: Optional[Dict[int, int]] = None):
+        super().__init__(name=f"crawler-{wid}", daemon=True)
+        self.wid, self.jobs, self.make_driver, self.retries = wid, jobs, make_driver, retries
+        self.base_url, self.limiter = base_url, limiter
+        self.results, self.failures, self.progress, self.lock = results, failures, progress, lock
+        self.driver, self.cookie_handled = None, False
+        self.done = 0
+        self.done_by_worker = {} if done_by_worker is None else done_by_worker
+
+    def _restart(self) -> None:
+        """A new browser on the start page. If it can't be started, self.driver is left None (retried next attempt)."""
+        driver, self.driver, self.cookie_handled = self.driver, None, False
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self.driver = self.make_driver()
+        self.driver.get(self.base_url)
+
+    def run(self) -> None:
+        try:
+            while True:
+                try:
+                    c = self.jobs.get_nowait()
+                except queue.Empty:
+                    return
+                self._crawl(c)
+                with self.lock:
+                    # Per-worker progress on the shared bar: CUSIPs crawled by each worker, and failures so far
+                    self.done_by_worker[self.wid] = self.done
+                    postfix = {f"w{w}": n for w, n in sorted(self.done_by_worker.items())}
+                    postfix["failed"] = len(self.failures)
+                    self.progress.set_postfix(postfix, refresh=False)
+                self.progress.update(1)
+        finally:
+            if self.driver is not None:
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
+            logging.info(f"[worker {self.wid}] finished: {self.done} CUSIPs")
+
+    def _crawl(self, c: str) -> None:
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Jittered exponential backoff; a browser can't see 429s, so every failure counts as throttling
+                if self.limiter is not None:
+                    self.limiter.on_throttle()
+                time.sleep(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)))
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                if self.driver is None:
+                    self._restart()
+                elif attempt:
+                    self.driver.get(self.base_url)
+                records = scrape_cusip(self.driver, c, self.cookie_handled)
+                self.cookie_handled = True
+                if self.limiter is not None:
+                    self.limiter.on_success()
+                with self.lock:
+                    self.results[c] = records
+                self.done += 1
+                logging.info(f"[worker {self.wid}] {c}: {len(records)} documents")
+                return
+            except WebDriverException as e:
+                # A crashed or wedged browser is replaced; a slow page is just retried
+                error = e
+                logging.warning(f"[worker {self.wid}] {c} attempt {attempt + 1}: {type(e).__name__}: {getattr(e, 'msg', e)}")
+                if not isinstance(e, TimeoutException):
+                    try:
+                        self._restart()
+                    except Exception as restart_error:
+                        logging.warning(f"[worker {self.wid}] browser restart failed: {restart_error}")
+            except Exception as e:
+                error = e
+                logging.warning(f"[worker {self.wid}] {c} attempt {attempt + 1}: {e}")
+        print("Error for", c, "→", error)
+        with self.lock:
+            self.failures.append({"CUSIP": c, "worker": self.wid, "error": str(error)})
+
+
+def crawl_cusips(list_cusip: List[str],
+                 workers: int = CRAWL_WORKERS,
+                 retries: int = CUSIP_RETRIES,
+                 make_driver: Callable[[], object] = setup_crawl_browser,
+                 failed_log_path: Optional[str] = None,
+                 base_url: str = EMMA_URL,
+                 limiter: Optional[AdaptiveRateLimiter] = None) -> pd.DataFrame:
+    """
+    Disclosure document rows of every CUSIP, crawled by `workers` independent browsers.
+
+    CUSIPs are handed out from one queue, so a slow CUSIP only holds up its own worker. Each worker
+    accepts the EMMA terms once in its own browser, retries a failing CUSIP `retries` times and
+    replaces its browser if it crashes. The progress bar shows the CUSIPs crawled by each worker (w0, w1,
+    ...) and the failures so far. Rows come back in `list_cusip` order, as the single-browser
+    loop produced them; CUSIPs that still fail are written to `failed_log_path`. `base_url` points the
+    browsers at another site, e.g. the local stand-in of emma_fixture_server.py. A shared `limiter`
+    (rate_limiter.AdaptiveRateLimiter) paces the searches of all workers and backs off when they fail.
+    """
+    jobs: "queue.Queue" = queue.Queue()
+    for c in dict.fromkeys(list_cusip):
+        jobs.put(c)
+    results: Dict[str, List[dict]] = {}
+    failures: List[dict] = []
+    done_by_worker: Dict[int, int] = {}
+    lock = threading.Lock()
+    with tqdm(total=jobs.qsize(), desc="CUSIPs") as progress:
+        threads = [_CrawlWorker(w, jobs, make_driver, retries, results, failures, progress, lock, base_url, limiter,
+                                done_by_worker)
+                   for w in range(min(workers, jobs.qsize()) or 1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    records = [r for c in dict.fromkeys(list_cusip) for r in results.get(c, [])]
+    if failures:
+        print(f"{len(failures)} CUSIPs failed")
+        if failed_log_path:
+            pd.DataFrame(failures).to_csv(failed_log_path, index=False)
+            print(f"Logged failed CUSIPs to {failed_log_path}")
+    return pd.DataFrame(records, columns=RECORD_COLUMNS)
@@ -0,0 +1,346 @@
+"""
+Local stand-in for the EMMA pages the disclosure-list scrapers read, for offline tests and benchmarks.
+
+    python emma_fixture_server.py build scrapping/disclosure_document_list_all.csv fixtures/emma
+    python emma_fixture_server.py serve fixtures/emma --port 8765 --latency 0.5
+    python emma_fixture_server.py bench fixtures/emma --workers 16 [--selenium]
+    python emma_fixture_server.py resume --size-mb 40 --drop-after-mb 4
+
+Fixtures are one HTML file per CUSIP (`<CUSIP>.html`). `record_fixtures` saves the real pages through
+a browser; `build_fixtures` renders them from a scraped disclosure_document_list_all.csv, laid out
+with the elements both harvesters read (tabs, disclosure tab, group rows, date columns, tooltips).
+"""
+import argparse
+import html
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+
+from emma_crawler import RECORD_COLUMNS
+
+HOME_PAGE = """<html><body>
+<form action="/QuickSearch/Transfer" method="get"><input id="quickSearchText" name="quickSearchText"></form>
+</body></html>"""
+
+SECURITY_PAGE = """<html><body>
+<form action="/QuickSearch/Transfer" method="get"><input id="quickSearchText" name="quickSearchText"></form>
+<ul class="ui-tabs-nav"><li><a href="#tabDisclosureDocuments">Continuing Disclosures</a></li></ul>
+<div id="tabDisclosureDocuments">
+<input type="radio" name="Filter.SelectedPredefinedDateRange" value="All" checked> <a href="#">Search</a>
+{tables}
+</div>
+{tooltips}
+</body></html>"""
+
+# Smallest well-formed PDF, served for every *.pdf URL
+DUMMY_PDF = (b"%PDF-1.1\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+             b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+             b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+             b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+def padded_pdf(size: int) -> bytes:
+    """DUMMY_PDF followed by `size` - len(DUMMY_PDF) bytes of seeded noise (a PDF reader ignores them)."""
+    return DUMMY_PDF + random.Random(size).getrandbits(8 * max(size - len(DUMMY_PDF), 0)).to_bytes(
+        max(size - len(DUMMY_PDF), 0), "little")
+
+
+def _cell(value) -> str:
+    return "" if pd.isna(value) else html.escape(str(value))
+
+
+def _kind(row) -> str:
+    if _cell(row.subgroup):
+        return "grouped"
+    if not _cell(row.period_date) and not _cell(row.posted_date):
+        # tooltip names are always "<section> - <document>"; a blank link is a table row with empty cells
+        return "tooltip" if " - " in _cell(row.document_name) else "ungrouped"
+    if not _cell(row.period_date) and _cell(row.posted_date) != "Details":
+        return "official"
+    return "ungrouped"
+
+
+def render_security_page(rows: pd.DataFrame) -> str:
+    """HTML of one CUSIP's security page holding `rows` (RECORD_COLUMNS), in the order the scrapers return them."""
+    tables, tooltips = [], []
+    run_kind, run_rows, last_group = None, [], None
+
+    def flush():
+        if run_rows:
+            tables.append("<table>\n" + "\n".join(run_rows) + "\n</table>")
+
+    for row in rows.itertuples(index=False):
+        kind = _kind(row)
+        link = f'<a href="{_cell(row.pdf_url)}">{_cell(row.document_name)}</a>'
+        if kind == "tooltip":
+            section, _, doc = str(row.document_name).partition(" - ")
+            inner = html.escape(f'<a href="{row.pdf_url}">{doc}</a>', quote=True)
+            tooltips.append(f'<a class="ihpQtipHelp rtTip" help="{inner}">{html.escape(section)}</a>')
+            continue
+        if kind != run_kind:
+            flush()
+            run_kind, run_rows, last_group = kind, [], None
+        if kind == "grouped" and row.subgroup != last_group:
+            run_rows.append(f'<tr class="groupRow"><th colspan="3">{_cell(row.subgroup)}</th></tr>')
+            last_group = row.subgroup
+        if kind == "official":
+            run_rows.append(f"<tr><td>{link}</td><td>{_cell(row.posted_date)}</td></tr>")
+        else:
+            run_rows.append(f"<tr><td>{link}</td><td>{_cell(row.period_date)}</td><td>{_cell(row.posted_date)}</td></tr>")
+    flush()
+    return SECURITY_PAGE.format(tables="\n".join(tables), tooltips="\n".join(tooltips))
+
+
+def build_fixtures(df_all: pd.DataFrame, out_dir: str) -> List[str]:
+    """Writes `<out_dir>/<CUSIP>.html` for every CUSIP of a scraped document list. Returns the CUSIPs."""
+    os.makedirs(out_dir, exist_ok=True)
+    cusips = list(dict.fromkeys(df_all["CUSIP"]))
+    for cusip, rows in df_all.groupby("CUSIP", sort=False):
+        with open(os.path.join(out_dir, f"{cusip}.html"), "w", encoding="utf-8") as f:
+            f.write(render_security_page(rows[RECORD_COLUMNS]))
+    return cusips
+
+
+def record_fixtures(list_cusip: List[str], out_dir: str, make_driver: Optional[Callable[[], object]] = None) -> None:
+    """Saves the real EMMA security page of every CUSIP, as the browser crawler sees it, to `out_dir`."""
+    from emma_crawler import EMMA_URL, scrape_cusip, setup_crawl_browser
+
+    os.makedirs(out_dir, exist_ok=True)
+    driver = (make_driver or setup_crawl_browser)()
+    try:
+        driver.get(EMMA_URL)
+        for i, cusip in enumerate(list_cusip):
+            scrape_cusip(driver, cusip, cookie_handled=i > 0)
+            with open(os.path.join(out_dir, f"{cusip}.html"), "w", encoding="utf-8") as f:
+                f.write(driver.page_source)
+    finally:
+        driver.quit()
+
+
+class FixtureServer:
+    """
+    Serves a fixtures folder as EMMA would: the home page with the quick search box, one security
+    page per CUSIP at /QuickSearch/Transfer?quickSearchText=<CUSIP>, and a small PDF for every *.pdf URL.
+    `latency` seconds are added to every security page, to benchmark under realistic response times.
+
+    PDFs are served with ETag, HEAD and Range / If-Range support. With `pdf_dir` every *.pdf URL maps
+    to the file at that path under `pdf_dir` (e.g. a downloaded university_pdfs folder); otherwise all
+    of them are one generated PDF, `pdf_size` bytes long. `drop_after` closes every PDF response after
+    that many bytes, as a flaky network would. `pdf_bytes_sent` counts the PDF bytes put on the wire.
+
+        with FixtureServer("fixtures/emma", latency=0.5) as server:
+            harvest_cusips(cusips, base_url=server.base_url)
+    """
+
+    def __init__(self, fixtures_dir: str, port: int = 0, latency: float = 0.0,
+                 pdf_size: Optional[int] = None, drop_after: Optional[int] = None, pdf_dir: Optional[str] = None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.requests = 0
+        self.pdf = DUMMY_PDF if pdf_size is None else padded_pdf(pdf_size)
+        self.pdf_dir = pdf_dir
+        self.drop_after = drop_after
+        self.pdf_bytes_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _pdf_body(self, url_path: str) -> Optional[bytes]:
+                if server.pdf_dir is None:
+                    return server.pdf
+                path = os.path.join(server.pdf_dir, *[p for p in unquote(url_path).split("/") if p not in ("", "..")])
+                if not os.path.isfile(path):
+                    return None
+                with open(path, "rb") as f:
+                    return f.read()
+
+            def _send_pdf(self, url_path: str, head: bool = False) -> None:
+                body = self._pdf_body(url_path)
+                if body is None:
+                    return self._send(404, b"Not found", "text/plain")
+                etag = f'"{len(body)}-{zlib.crc32(body):08x}"'
+                start, end = 0, len(body) - 1
+                rng = self.headers.get("Range", "")
+                if rng.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+                    first, _, last = rng[len("bytes="):].partition("-")
+                    if first:
+                        start, end = int(first), min(int(last), end) if last else end
+                    else:   # suffix range: the last N bytes
+                        start = max(len(body) - int(last), 0)
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(end + 1 - start))
+                self.send_header("ETag", etag)
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                if head:
+                    return
+                chunk = body[start:end + 1]
+                if server.drop_after is not None:
+                    chunk = chunk[:server.drop_after]
+                self.wfile.write(chunk)
+                server.pdf_bytes_sent += len(chunk)
+                if len(chunk) < end + 1 - start:
+                    self.close_connection = True   # drop the connection mid-body
+
+            def do_HEAD(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                if url.path.endswith(".pdf"):
+                    return self._send_pdf(url.path, head=True)
+                self.send_response(200)
+                self.end_headers()
+
+            def do_GET(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                if url.path.endswith(".pdf"):
+                    return self._send_pdf(url.path)
+                if url.path == "/QuickSearch/Transfer":
+                    cusip = parse_qs(url.query).get("quickSearchText", [""])[0]
+                    page = os.path.join(server.fixtures_dir, f"{os.path.basename(cusip)}.html")
+                    time.sleep(server.latency)
+                    if not os.path.exists(page):
+                        return self._send(404, b"Unknown CUSIP", "text/plain")
+                    with open(page, "rb") as f:
+                        return self._send(200, f.read(), "text/html; charset=utf-8")
+                return self._send(200, HOME_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def compare_records(expected: pd.DataFrame, actual: pd.DataFrame) -> pd.DataFrame:
+    """Rows present in only one of two harvests (RECORD_COLUMNS, blanks and NaN treated alike)."""
+    a = expected[RECORD_COLUMNS].fillna("").astype(str)
+    b = actual[RECORD_COLUMNS].fillna("").astype(str)
+    diff = a.merge(b, how="outer", indicator=True)
+    return diff[diff["_merge"] != "both"]
+
+
+def benchmark(fixtures_dir: str, workers: int = 16, latency: float = 0.5, selenium: bool = False,
+              crawl_workers: int = 4) -> pd.DataFrame:
+    """Times the HTTP harvester (and optionally the browser crawler) against the fixtures. One row per harvester."""
+    from emma_crawler import crawl_cusips
+    from emma_http_harvester import harvest_cusips
+
+    cusips = sorted(f[:-5] for f in os.listdir(fixtures_dir) if f.endswith(".html"))
+    rows = []
+    with FixtureServer(fixtures_dir, latency=latency) as server:
+        runs = [("http", lambda: harvest_cusips(cusips, workers=workers, base_url=server.base_url))]
+        if selenium:
+            runs.append(("selenium", lambda: crawl_cusips(cusips, workers=crawl_workers, base_url=server.base_url)))
+        results = {}
+        for name, run in runs:
+            start = time.perf_counter()
+            results[name] = run()
+            seconds = time.perf_counter() - start
+            rows.append({"harvester": name, "cusips": len(cusips), "documents": len(results[name]),
+                         "seconds": round(seconds, 2), "cusips_per_second": round(len(cusips) / seconds, 1)})
+        if selenium:
+            mismatches = compare_records(results["selenium"], results["http"])
+            print(f"{len(mismatches)} rows differ between the browser and HTTP harvests")
+    return pd.DataFrame(rows)
+
+
+def resume_check(size: int, drop_after: int) -> dict:
+    """
+    Downloads one `size`-byte PDF with pdf_downloader.download_via_requests from a server that drops
+    every response after `drop_after` bytes. Reports whether the file arrived intact and the bytes sent.
+    """
+    from pdf_downloader import make_session, download_via_requests
+
+    with FixtureServer(tempfile.gettempdir(), pdf_size=size, drop_after=drop_after) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        dest = Path(tmp) / "document.pdf"
+        attempts = -(-size // drop_after)
+        status, got, error = download_via_requests(make_session(1), f"{server.base_url}document.pdf", dest,
+                                                   attempts=attempts)
+        intact = dest.exists() and dest.read_bytes() == server.pdf
+        return {"status": status, "intact": intact, "size": size, "bytes_sent": server.pdf_bytes_sent,
+                "requests": server.requests, "error": error}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local EMMA stand-in for the disclosure-list scrapers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="render fixtures from a scraped disclosure_document_list_all.csv")
+    build.add_argument("csv")
+    build.add_argument("out_dir")
+    serve = sub.add_parser("serve", help="serve a fixtures folder")
+    serve.add_argument("fixtures_dir")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0)
+    bench = sub.add_parser("bench", help="time the harvesters against a fixtures folder")
+    bench.add_argument("fixtures_dir")
+    bench.add_argument("--workers", type=int, default=16)
+    bench.add_argument("--latency", type=float, default=0.5)
+    bench.add_argument("--selenium", action="store_true", help="also run the browser crawler (needs Chrome)")
+    resume = sub.add_parser("resume", help="check resumed downloads against a server that drops connections")
+    resume.add_argument("--size-mb", type=float, default=40)
+    resume.add_argument("--drop-after-mb", type=float, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        cusips = build_fixtures(pd.read_csv(args.csv, dtype=str), args.out_dir)
+        print(f"{len(cusips)} fixtures written to {args.out_dir}")
+    elif args.command == "serve":
+        server = FixtureServer(args.fixtures_dir, args.port, args.latency)
+        print(f"Serving {args.fixtures_dir} at {server.base_url} (Ctrl+C to stop)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.httpd.server_close()
+    elif args.command == "resume":
+        print(resume_check(int(args.size_mb * 2**20), int(args.drop_after_mb * 2**20)))
+    else:
+        print(benchmark(args.fixtures_dir, args.workers, args.latency, args.selenium).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from urllib.parse import quote, urljoin
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+
+from emma_crawler import (CUSIP_RETRIES, EMMA_URL, RECORD_COLUMNS, scrape_cusip, setup_crawl_browser,
+                          tooltip_pdfs)
+from pdf_downloader import TIMEOUT, copy_browser_cookies, make_session
+from rate_limiter import HostRateLimiter
+
+HARVEST_WORKERS = 16
+# Page holding a security's disclosure tab, relative to the base URL. The default is the request the
+# quick search box submits; the "All" date range is asked for with the same filter field the tab's form posts.
+DISCLOSURE_PATH = "QuickSearch/Transfer?quickSearchText={cusip}&Filter.SelectedPredefinedDateRange=All"
+DISCLAIMER_BUTTON_ID = "ctl00_mainContentArea_disclaimerContent_yesButton"
+
+
+class DisclaimerPage(Exception):
+    """EMMA answered with its terms-of-use page: the session has not accepted them yet."""
+
+
+def _text(el) -> str:
+    # Selenium's `.text`: the rendered text, whitespace collapsed
+    return " ".join(el.get_text(" ").split()) if el is not None else ""
+
+
+def parse_disclosure_html(page_html: str, cusip: str, base_url: str = EMMA_URL) -> List[dict]:
+    """
+    Disclosure document rows of one security page, read from its HTML the way emma_crawler.scrape_cusip
+    reads them from the browser: every .pdf link of the disclosure tab with the period / posted dates
+    of its table row and the nearest group header above it, followed by the tooltip PDFs.
+    """
+    soup = BeautifulSoup(page_html, "html.parser")
+    tab = soup.find(id="tabDisclosureDocuments")
+    if tab is None:
+        if soup.find(id=DISCLAIMER_BUTTON_ID) is not None:
+            raise DisclaimerPage(cusip)
+        raise ValueError(f"No disclosure tab in the page of {cusip}")
+
+    records = []
+    for link in tab.find_all("a", href=lambda h: h and ".pdf" in h):
+        row = link.find_parent("tr")
+        if row is None:
+            continue
+        cols = row.find_all("td")
+        if len(cols) == 2:
+            # Official Statements table
+            period = ""
+            posted = _text(cols[1])
+        else:
+            period = _text(cols[1]) if len(cols) > 1 else ""
+            posted = _text(cols[2]) if len(cols) > 2 else ""
+        group_row = row.find_previous_sibling(
+            lambda tag: tag.name == "tr" and "groupRow" in (tag.get("class") or []))
+        records.append({
+            "CUSIP": cusip,
+            "subgroup": _text(group_row.find("th")) if group_row is not None else "",
+            "document_name": _text(link),
+            "pdf_url": urljoin(base_url, link["href"]),
+            "period_date": period,
+            "posted_date": posted,
+        })
+
+    for pdf in tooltip_pdfs(page_html):
+        records.append({
+            "CUSIP": cusip,
+            "subgroup": "",
+            "document_name": pdf["document_name"],
+            "pdf_url": pdf["pdf_url"],
+            "period_date": "",
+            "posted_date": "",
+        })
+    return records
+
+
+def fetch_disclosures(session: requests.Session, cusip: str, base_url: str = EMMA_URL,
+                      path: str = DISCLOSURE_PATH) -> List[dict]:
+    url = urljoin(base_url, path.format(cusip=quote(cusip)))
+    r = session.get(url, timeout=TIMEOUT)
+    r.raise_for_status()
+    return parse_disclosure_html(r.text, cusip, base_url)
+
+
+def accepted_session(cusip: str, workers: int = HARVEST_WORKERS, make_driver: Optional[Callable[[], object]] = None,
+                     base_url: str = EMMA_URL, limiter: Optional[HostRateLimiter] = None) -> requests.Session:
+    """
+    HTTP session carrying the cookies of a browser that searched `cusip` and accepted the EMMA terms.
+    One browser is started for this and closed again.
+    """
+    driver = (make_driver or setup_crawl_browser)()
+    try:
+        driver.get(base_url)
+        scrape_cusip(driver, cusip, cookie_handled=False)
+        session = make_session(pool_size=workers, limiter=limiter)
+        copy_browser_cookies(driver, session)
+        return session
+    finally:
+        driver.quit()
+
+
+def harvest_cusips(list_cusip: List[str],
+                   workers: int = HARVEST_WORKERS,
+                   session: Optional[requests.Session] = None,
+                   base_url: str = EMMA_URL,
+                   path: str = DISCLOSURE_PATH,
+                   retries: int = CUSIP_RETRIES,
+                   failed_log_path: Optional[str] = None,
+                   limiter: Optional[HostRateLimiter] = None) -> pd.DataFrame:
+    """
+    Same rows as emma_crawler.crawl_cusips, fetched as plain HTML over one pooled HTTP session.
+
+    EMMA only serves the pages once its terms are accepted: pass a session carrying the cookies of a
+    browser that accepted them (`accepted_session`). A CUSIP answered with the terms
+    page fails at once instead of being retried. Without a `session`, one is made that paces its
+    requests with `limiter` (rate_limiter.HostRateLimiter), if given.
+    """
+    session = session or make_session(pool_size=workers, limiter=limiter)
+    cusips = list(dict.fromkeys(list_cusip))
+
+    def harvest(cusip: str):
+        error = None
+        for attempt in range(retries + 1):
+            try:
+                return fetch_disclosures(session, cusip, base_url, path), None
+            except DisclaimerPage as e:
+                return [], f"terms of use not accepted ({e})"
+            except Exception as e:
+                error = e
+                logging.warning(f"{cusip} attempt {attempt + 1}: {e}")
+        return [], str(error)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(tqdm(pool.map(harvest, cusips), total=len(cusips), desc="CUSIPs"))
+
+    failures = [{"CUSIP": c, "error": err} for c, (_, err) in zip(cusips, results) if err is not None]
+    if failures:
+        print(f"{len(failures)} CUSIPs failed")
+        if failed_log_path:
+            pd.DataFrame(failures).to_csv(failed_log_path, index=False)
+            print(f"Logged failed CUSIPs to {failed_log_path}")
+    return pd.DataFrame([r for records, _ in results for r in records], columns=RECORD_COLUMNS)
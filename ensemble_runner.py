@@ -0,0 +1,155 @@
+"""
+Repeated extraction runs with early stopping: the consensus of up to MAX_RUNS runs per school, where
+a school only gets another run while its runs still disagree.
+
+The balance sheet used to be extracted three times for every school (..._bs_1013.xlsx, _2, _3) and
+voted on offline with safe_mode (find_mode_balance_sheet_250926.ipynb). Here every school gets
+MIN_RUNS runs; after that a school is settled when, for every file and column, its runs so far agree:
+  - no run has a value (the document does not have the item), or
+  - one value came out of at least two runs and more often than any other, or
+  - all values (at least two) are within `tolerance` of their average (EXACT by default: all equal)
+and only unsettled schools are extracted again. The consensus of the runs made is consensus.consensus,
+i.e. safe_mode, over the same rows the offline vote would see (run by run, files in order): a school
+whose first runs agree gets the value another run would most likely have confirmed.
+
+A `tolerance` above EXACT (e.g. consensus.AGREE_ALL) settles more schools early but leaves the offline
+vote's semantics: two runs that nearly agree (100 and 100.5) tie, so safe_mode returns the last row's
+value, where a third run would have decided between them.
+
+Each run needs its own extraction results, so runs after the first are keyed apart in the extraction
+cache (ExtractionCache.cached(..., variant="run2")) and recorded in a journal of their own:
+
+    def extract_for_run(run):
+        return trimmed_extractor(cache.cached(scheduler.wrap(agent.extract), SFP,
+                                              variant=None if run == 1 else f"run{run}"),
+                                 "financial_position", top_k=6)
+
+    result = run_ensemble(extract_for_run, PDF_ROOT, postprocess=add_plug_accounts,
+                          journal_for_run=lambda run: RunJournal(f"{OUTPUT_ROOT}/run_journal_{run}.jsonl", schema=SFP,
+                                                                 statement="balance_sheet", fiscal_year=2024))
+
+tests/test_ensemble_runner.py runs it on simulated extractions and checks the consensus against the
+full MAX_RUNS vote.
+"""
+from typing import Any, Callable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from consensus import consensus
+from extraction_engine import MAX_WORKERS, ExtractionOutcome, extract_jobs, school_jobs
+from run_journal import RunJournal, extract_jobs_resumable
+
+MIN_RUNS = 2   # runs every school gets
+MAX_RUNS = 3   # runs a school whose results keep disagreeing gets at most
+EXACT = 0.0    # settle on identical values only, keeping the offline vote's result
+
+KEY_COLUMNS = ["run", "school", "file"]
+
+
+class EnsembleResult(NamedTuple):
+    consensus: pd.DataFrame     # one row per school (index "school"), as consensus.consensus returns it
+    runs: pd.DataFrame          # every extracted row: run, school, file and the (postprocessed) columns
+    runs_per_school: pd.Series  # school -> number of runs made
+    extractions: int            # extraction jobs issued (journaled ones included)
+    full_extractions: int       # what MAX_RUNS runs of every file would have issued
+
+
+def run_frame(outcomes: List[ExtractionOutcome], run: int,
+              postprocess: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None) -> pd.DataFrame:
+    """
+    Rows of one run's successful outcomes, as the notebooks build them (one row per (school, file),
+    `postprocess` applied to that frame), with run / school / file as the first columns.
+    """
+    results = {(o.school, o.fname): o.run.data or {} for o in outcomes if o.error is None}
+    df = pd.DataFrame.from_dict(results, orient="index")
+    if df.empty:
+        return pd.DataFrame(columns=KEY_COLUMNS)
+    df.index = pd.MultiIndex.from_tuples(df.index, names=["school", "file"])
+    if postprocess is not None:
+        df = postprocess(df)
+    df = df.reset_index()
+    df.insert(0, "run", run)
+    return df
+
+
+def settled_schools(runs: pd.DataFrame, tolerance: float = EXACT) -> pd.Series:
+    """
+    school -> whether its runs agree on every file and column (see the module docstring).
+    Only the rows of `runs` are looked at, so pass those of the runs made so far.
+    """
+    values = runs.drop(columns="run").melt(id_vars=["school", "file"], var_name="column").dropna(subset=["value"])
+    keys = ["school", "file", "column"]
+    if values.empty:
+        return pd.Series(True, index=pd.Index(runs["school"].unique(), name="school"))
+
+    # Vote counts: the most frequent value and the runner-up of every (school, file, column)
+    counts = values.groupby(keys + ["value"], sort=False).size().sort_values(ascending=False, kind="stable")
+    rank = counts.groupby(level=keys, sort=False).cumcount()
+    top = counts[rank.to_numpy() == 0].droplevel("value")
+    second = counts[rank.to_numpy() == 1].droplevel("value").reindex(top.index, fill_value=0)
+    voted = (top >= 2) & (top > second)
+
+    # Near agreement of numeric values
+    number = pd.to_numeric(values["value"], errors="coerce")
+    numeric = values.assign(value=number).dropna(subset=["value"]).groupby(keys)["value"]
+    low, high, mean, n = numeric.min(), numeric.max(), numeric.mean(), numeric.count()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spread = np.maximum(high - mean, mean - low) / mean.abs()
+    near = (n >= 2) & ((spread < tolerance) | (high == low))
+
+    agree = voted | near.reindex(voted.index, fill_value=False)
+    by_school = agree.groupby(level="school").all()
+    return by_school.reindex(pd.Index(runs["school"].unique(), name="school"), fill_value=True)
+
+
+def run_ensemble(extract_for_run: Callable[[int], Callable[[str], Any]],
+                 pdf_root: str,
+                 max_workers: int = MAX_WORKERS,
+                 select_files: Optional[Callable[[List[str]], List[str]]] = None,
+                 postprocess: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+                 journal_for_run: Optional[Callable[[int], RunJournal]] = None,
+                 min_runs: int = MIN_RUNS,
+                 max_runs: int = MAX_RUNS,
+                 tolerance: float = EXACT) -> EnsembleResult:
+    """
+    Extracts the selected PDFs of every school under `pdf_root` `min_runs` times, then again, run by
+    run up to `max_runs`, for the schools whose runs still disagree; returns their consensus.
+
+    `extract_for_run(run)` is the extract function of run 1, 2, ... (its results must not be another
+    run's, see the module docstring). With `journal_for_run`, each run is journaled and resumable.
+    """
+    if not 1 <= min_runs <= max_runs:
+        raise ValueError(f"need 1 <= min_runs <= max_runs, not {min_runs}, {max_runs}")
+    jobs = school_jobs(pdf_root, select_files)
+    pending = {job[0] for job in jobs}
+    frames = []
+    runs_per_school = pd.Series(0, index=pd.Index(sorted(pending), name="school"))
+    extractions = 0
+    for run in range(1, max_runs + 1):
+        todo = [job for job in jobs if job[0] in pending]
+        if not todo:
+            break
+        extract = extract_for_run(run)
+        if journal_for_run is not None:
+            outcomes = extract_jobs_resumable(extract, todo, journal_for_run(run), max_workers)
+        else:
+            outcomes = extract_jobs(extract, todo, max_workers)
+        extractions += len(todo)
+        runs_per_school[sorted(pending)] += 1
+        frames.append(run_frame(outcomes, run, postprocess))
+
+        if run >= min_runs and run < max_runs:
+            runs = pd.concat(frames, ignore_index=True)
+            settled = settled_schools(runs[runs["school"].isin(pending)], tolerance)
+            done = set(settled.index[settled])
+            # A school none of whose files was ever extracted has nothing to compare: it is retried
+            pending -= done
+            print(f"Run {run}: {len(done)} schools settled, {len(pending)} get another run")
+
+    runs = pd.concat(frames, ignore_index=True)
+    voted = consensus(runs.drop(columns=["run", "file"]), by="school")
+    full = len(jobs) * max_runs
+    print(f"Ensemble: {extractions} extractions instead of {full} "
+          f"({(full - extractions) / max(full, 1):.0%} saved), {len(voted)} schools")
+    return EnsembleResult(voted, runs, runs_per_school, extractions, full)
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import pandas as pd
+
+# Default location of the cache, relative to the notebook's working directory
+CACHE_DIR = ".extraction_cache"
+
+
+class CachedRun(NamedTuple):
+    """Stand-in for a LlamaExtract run: exposes the two attributes the notebooks read."""
+    data: Optional[dict]
+    extraction_metadata: Optional[dict] = None
+
+
+# (st_dev, st_ino, size, mtime) -> SHA-256: hard-linked copies of a PDF (pdf_blob_store) are read once
+_SHA256_BY_INODE: Dict[tuple, str] = {}
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file bytes, read in chunks (once per inode and modification time)."""
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    known = _SHA256_BY_INODE.get(key)
+    if known is not None:
+        return known
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    _SHA256_BY_INODE[key] = h.hexdigest()
+    return _SHA256_BY_INODE[key]
+
+
+def schema_hash(schema: Any) -> str:
+    """
+    Canonical hash of an extraction schema.
+
+    Accepts a Pydantic model class (e.g. `StatementOfCashFlows2024`, the class returned by
+    `generate_income_statement_schema(2024)`), a model instance, or an already dumped JSON schema dict.
+    Field descriptions are part of the hash, so any prompt change invalidates the cache.
+    """
+    if hasattr(schema, "model_json_schema"):
+        schema = schema.model_json_schema()
+    elif hasattr(schema, "schema"):
+        schema = schema.schema()
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache of extraction results.
+
+    Entries are stored as `<root>/<schema hash>/<pdf sha256>.json`, so the same PDF found under
+    several school folders is only extracted once per schema.
+
+    Parameters:
+    -----------
+    root : str
+        Cache folder.
+    max_bytes : int, optional
+        Size budget used by `evict()`; least recently used entries are removed first.
+    max_age_days : float, optional
+        Entries written longer ago than this are removed by `evict()` and ignored by `get()`.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def entry_path(self, pdf_path: str, schema_key: str) -> str:
+        return os.path.join(self.root, schema_key[:16], f"{file_sha256(pdf_path)}.json")
+
+    def _expired(self, payload: Dict[str, Any], max_age_days: Optional[float]) -> bool:
+        """Whether an entry is older than `max_age_days`, counted from when it was written (not last used)."""
+        if max_age_days is None:
+            return False
+        return time.time() - payload.get("created", 0) > max_age_days * 86400
+
+    def get(self, pdf_path: str, schema: Any) -> Optional[CachedRun]:
+        """Stored run for (PDF, schema), or None on a miss."""
+        return self._get(pdf_path, schema_hash(schema))
+
+    def put(self, pdf_path: str, schema: Any, run: Any) -> None:
+        """Stores `run.data` and `run.extraction_metadata` for (PDF, schema)."""
+        self._put(pdf_path, schema_hash(schema), run)
+
+    def _get(self, pdf_path: str, schema_key: str) -> Optional[CachedRun]:
+        entry = self.entry_path(pdf_path, schema_key)
+        try:
+            with open(entry, encoding="utf-8") as f:
+                payload = json.load(f)
+            if self._expired(payload, self.max_age_days):
+                raise FileNotFoundError(entry)
+            os.utime(entry)  # last use, for LRU eviction (age is payload["created"])
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return CachedRun(payload.get("data"), payload.get("extraction_metadata"))
+
+    def _put(self, pdf_path: str, schema_key: str, run: Any) -> None:
+        entry = self.entry_path(pdf_path, schema_key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        payload = {
+            "source": os.path.abspath(pdf_path),
+            "created": time.time(),
+            "data": run.data,
+            "extraction_metadata": getattr(run, "extraction_metadata", None),
+        }
+        tmp = f"{entry}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+        os.replace(tmp, entry)
+        with self._lock:
+            self.writes += 1
+
+    def cached(self, extract: Callable[[str], Any], schema: Any, variant: Optional[str] = None) -> Callable[[str], Any]:
+        """
+        Wraps `extract` (usually `agent.extract`) so cache hits skip the service call.
+
+        The schema hash is computed once here, so wrap again after changing the schema.
+        Failed extractions are not cached. A `variant` (e.g. "run2" of an ensemble, see
+        ensemble_runner.py) gets entries of its own, so repeated runs are not served each other's results.
+        """
+        schema_key = schema_hash(schema)
+        if variant:
+            schema_key = hashlib.sha256(f"{schema_key}:{variant}".encode("utf-8")).hexdigest()
+
+        def extract_cached(path: str) -> Any:
+            hit = self._get(path, schema_key)
+            if hit is not None:
+                return hit
+            run = extract(path)
+            self._put(path, schema_key, run)
+            return run
+
+        return extract_cached
+
+    def entries(self) -> pd.DataFrame:
+        """One row per cache entry: schema, pdf hash, bytes, modified time."""
+        rows = []
+        for schema_dir in sorted(os.listdir(self.root)):
+            full_dir = os.path.join(self.root, schema_dir)
+            if not os.path.isdir(full_dir):
+                continue
+            for fname in sorted(os.listdir(full_dir)):
+                if not fname.endswith(".json"):
+                    continue
+                path = os.path.join(full_dir, fname)
+                st = os.stat(path)
+                rows.append({"schema": schema_dir, "pdf_sha256": fname[:-5], "path": path,
+                             "bytes": st.st_size, "mtime": st.st_mtime})
+        return pd.DataFrame(rows, columns=["schema", "pdf_sha256", "path", "bytes", "mtime"])
+
+    @staticmethod
+    def _payload(path: str) -> Dict[str, Any]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def evict(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """
+        Removes entries written more than `max_age_days` ago, then least recently used entries until
+        the cache fits in `max_bytes`. Defaults to the limits given to the constructor.
+        Returns the number of removed entries.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        df = self.entries().sort_values("mtime")
+        drop = pd.Series(False, index=df.index)
+        if max_age_days is not None:
+            drop |= df["path"].map(lambda path: self._expired(self._payload(path), max_age_days))
+        if max_bytes is not None:
+            # Keep the most recently used entries that fit in the budget
+            kept_bytes = df["bytes"].where(~drop, 0)[::-1].cumsum()[::-1]
+            drop |= kept_bytes > max_bytes
+        for path in df.loc[drop, "path"]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return int(drop.sum())
+
+    def report(self) -> Dict[str, Any]:
+        """Hit/miss counters of this session plus the current size of the cache."""
+        df = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "entries": len(df),
+            "schemas": df["schema"].nunique(),
+            "bytes": int(df["bytes"].sum()),
+        }
@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import pandas as pd
+
+# Number of PDFs in flight at once. LlamaExtract jobs are almost entirely network wait,
+# so this can be much higher than the CPU count. Lower it if the API starts throttling.
+MAX_WORKERS = 8
+
+
+class ExtractionOutcome(NamedTuple):
+    """Result of one extraction job. Exactly one of `run` / `error` is set."""
+    school: str
+    fname: str
+    path: str
+    run: Any = None
+    error: Optional[Exception] = None
+
+
+def list_school_pdfs(school_dir: str) -> List[str]:
+    """Sorted PDF file names in a school folder (same order the notebooks use)."""
+    return [f for f in sorted(os.listdir(school_dir)) if f.lower().endswith(".pdf")]
+
+
+def list_schools(pdf_root: str) -> List[str]:
+    """Sorted school folder names under PDF_ROOT."""
+    return [s for s in sorted(os.listdir(pdf_root)) if os.path.isdir(os.path.join(pdf_root, s))]
+
+
+def _run_one(extract: Callable[[str], Any], school: str, fname: str, path: str) -> ExtractionOutcome:
+    try:
+        return ExtractionOutcome(school, fname, path, run=extract(path))
+    except Exception as err:
+        return ExtractionOutcome(school, fname, path, error=err)
+
+
+def extract_jobs(extract: Callable[[str], Any],
+                 jobs: Iterable[tuple],
+                 max_workers: int = MAX_WORKERS,
+                 on_result: Optional[Callable[[ExtractionOutcome], None]] = None) -> List[ExtractionOutcome]:
+    """
+    Runs `extract(path)` for every (school, fname, path) job with at most `max_workers` in flight.
+
+    Outcomes are returned in the same order as `jobs`, no matter in which order they finish.
+    `on_result` is called from the calling thread as soon as each job completes.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        futures = [pool.submit(_run_one, extract, *job) for job in jobs]
+        for fut in as_completed(futures):
+            outcome = fut.result()
+            if outcome.error is not None:
+                print(f"Skipped {outcome.school}/{outcome.fname}: {outcome.error}")
+            else:
+                print(f"Extracted data from {outcome.school}/{outcome.fname}")
+            if on_result is not None:
+                on_result(outcome)
+    return [fut.result() for fut in futures]
+
+
+def school_jobs(pdf_root: str,
+                select_files: Optional[Callable[[List[str]], List[str]]] = None) -> List[tuple]:
+    """(school, fname, path) for every PDF under `pdf_root`, in sorted school / file order."""
+    jobs = []
+    for school in list_schools(pdf_root):
+        school_dir = os.path.join(pdf_root, school)
+        fnames = list_school_pdfs(school_dir)
+        if select_files is not None:
+            fnames = select_files(fnames)
+        jobs.extend((school, fname, os.path.join(school_dir, fname)) for fname in fnames)
+    return jobs
+
+
+def group_by_school(pdf_root: str, outcomes: Iterable[ExtractionOutcome]) -> Dict[str, List[ExtractionOutcome]]:
+    """school -> outcomes, with every school folder of `pdf_root` present (possibly with no outcomes)."""
+    by_school = {school: [] for school in list_schools(pdf_root)}
+    for outcome in outcomes:
+        by_school.setdefault(outcome.school, []).append(outcome)
+    return by_school
+
+
+def extract_schools(extract: Callable[[str], Any],
+                    pdf_root: str,
+                    max_workers: int = MAX_WORKERS,
+                    select_files: Optional[Callable[[List[str]], List[str]]] = None,
+                    on_result: Optional[Callable[[ExtractionOutcome], None]] = None) -> Dict[str, List[ExtractionOutcome]]:
+    """
+    Extracts every PDF of every school under `pdf_root` through one shared pool.
+
+    Parameters:
+    -----------
+    extract : callable
+        Usually `agent.extract`. Receives a PDF path and returns the run object.
+    pdf_root : str
+        Folder holding one sub-folder per school.
+    max_workers : int
+        Maximum number of extraction jobs in flight across all schools.
+    select_files : callable, optional
+        Receives the sorted PDF names of a school and returns the ones to extract
+        (e.g. only the files with "financial" in the name).
+
+    Returns:
+    --------
+    dict
+        school -> outcomes in sorted file order. Schools are in sorted order.
+    """
+    jobs = school_jobs(pdf_root, select_files)
+    return group_by_school(pdf_root, extract_jobs(extract, jobs, max_workers, on_result))
+
+
+def merge_data(datas: Iterable[Optional[dict]]) -> Optional[dict]:
+    """
+    Combines the per-file results of one school, in file order.
+
+    The keys come from the first successful extraction and the last non-empty value wins,
+    exactly like the `combined` / `first_keys` loop in the extraction notebooks.
+    Returns None if no extraction succeeded.
+    """
+    combined   = {}
+    first_keys = None
+    for data in datas:
+        if data is None:
+            continue
+        if first_keys is None:
+            first_keys = list(data.keys())
+            combined   = {k: None for k in first_keys}
+        for k, v in data.items():
+            if v not in (None, "", []):
+                combined[k] = v
+    return combined if first_keys else None
+
+
+def run_data(outcome: ExtractionOutcome) -> Optional[dict]:
+    """`run.data or {}` for successful outcomes, None for failed ones."""
+    if outcome.error is not None:
+        return None
+    return outcome.run.data or {}
+
+
+def merge_outcomes(outcomes: List[ExtractionOutcome],
+                   transform: Optional[Callable[[dict], dict]] = None) -> Optional[dict]:
+    """Merges the outcomes of one school. `transform` is applied to each run's data before merging."""
+    datas = (run_data(o) for o in outcomes)
+    if transform is not None:
+        datas = (None if d is None else transform(d) for d in datas)
+    return merge_data(datas)
+
+
+def combine_schools(by_school: Dict[str, List[ExtractionOutcome]],
+                    column: str,
+                    transform: Optional[Callable[[dict], dict]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    One single-column "Metric" DataFrame per school, as written to each Excel sheet by the notebooks.
+    Schools with no successful extraction are left out.
+    """
+    frames = {}
+    for school, outcomes in by_school.items():
+        combined = merge_outcomes(outcomes, transform)
+        if combined is None:
+            print(f"No data for {school}.")
+            continue
+        df = pd.DataFrame.from_dict(combined, orient="index", columns=[column])
+        df.index.name = "Metric"
+        frames[school] = df
+    return frames
@@ -0,0 +1,217 @@
+"""
+Full-text search over the downloaded disclosure PDFs (SQLite FTS5, one row per page).
+
+    python fulltext_search.py build private_universities/university_pdfs university_pdfs_hy
+    python fulltext_search.py search '"net assets released"' --school BRADLEY_UNIVERSITY
+    python fulltext_search.py search "swap OR swaps" --year 2024 --limit 20
+
+Queries use the FTS5 syntax: words are ANDed, "quoted text" is a phrase, OR / NOT / NEAR(...) work.
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+import pdf_flagger
+from extraction_cache import file_sha256
+from page_text_store import STORE_PATH, PageTextStore
+from pdf_flagger import extract_page_texts, list_pdfs, parse_school_from_path
+
+# Default location of the index, relative to the working directory
+INDEX_PATH = ".fulltext_index.sqlite"
+
+# EMMA file names end with "..._for_the_year_ended_06_30_2024__430_KB_.pdf"
+_YEAR_ENDED = re.compile(r"year_ended_\d{2}_\d{2}_(\d{4})", re.IGNORECASE)
+_FY = re.compile(r"\bFY_?(\d{2}|\d{4})(?!\d)", re.IGNORECASE)
+
+
+def parse_fiscal_year(pdf_path: str) -> Optional[int]:
+    """Fiscal year from the file name ("year ended MM DD YYYY", else "FY24" / "FY2024"), or None."""
+    name = os.path.basename(pdf_path)
+    m = _YEAR_ENDED.search(name)
+    if m:
+        return int(m.group(1))
+    m = _FY.search(name.replace("_", " "))
+    if m:
+        year = int(m.group(1))
+        return year + 2000 if year < 100 else year
+    return None
+
+
+def phrase(text: str) -> str:
+    """`text` as one FTS5 phrase, e.g. phrase("net assets released") -> '"net assets released"'."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _read_document(pdf_path: str) -> Tuple[str, Optional[str], List[str]]:
+    try:
+        return pdf_path, file_sha256(pdf_path), extract_page_texts(pdf_path)
+    except Exception as e:
+        logging.warning(f"Jump: {pdf_path}: {e}")
+        return pdf_path, None, []
+
+
+def _init_search_worker(page_text_store: Optional[PageTextStore]) -> None:
+    pdf_flagger.PAGE_TEXT_STORE = page_text_store
+
+
+class FullTextIndex:
+    """
+    SQLite FTS5 index of page text, keyed by school, document, page and fiscal year.
+
+    Page text comes through pdf_flagger.extract_page_texts, i.e. from the PageTextStore when one is set.
+    `update()` is incremental: documents whose path and hash are already indexed are skipped, changed
+    files are re-indexed and (with `prune=True`) files that disappeared are dropped.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " doc_id INTEGER PRIMARY KEY, document TEXT UNIQUE NOT NULL, sha256 TEXT NOT NULL,"
+                " school TEXT, fiscal_year INTEGER, pages INTEGER)"
+            )
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5("
+                " text, doc_id UNINDEXED, page UNINDEXED, tokenize = 'unicode61')"
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _remove(self, doc_ids: Iterable[int]) -> None:
+        for doc_id in doc_ids:
+            self.conn.execute("DELETE FROM page_fts WHERE doc_id = ?", (doc_id,))
+            self.conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+    def update(self, folder_path: str, workers: int = 1, prune: bool = True) -> pd.DataFrame:
+        """
+        Indexes the PDFs under `folder_path` that are new or changed since the last update.
+        Returns one row per document of the folder with its status (indexed / unchanged / failed / removed).
+        """
+        paths = list_pdfs(folder_path)
+        known = {doc: (doc_id, sha) for doc_id, doc, sha in
+                 self.conn.execute("SELECT doc_id, document, sha256 FROM documents")}
+        todo, status = [], {}
+        for path in paths:
+            if path in known and known[path][1] == file_sha256(path):
+                status[path] = "unchanged"
+            else:
+                todo.append(path)
+        logging.info(f"Full-text index: {len(paths) - len(todo)} of {len(paths)} documents unchanged; indexing {len(todo)}")
+
+        if workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                                     initargs=(pdf_flagger.PAGE_TEXT_STORE,)) as pool:
+                results = pool.map(_read_document, todo, chunksize=4)
+                self._insert(results, known, status)
+        else:
+            self._insert((_read_document(p) for p in todo), known, status)
+
+        if prune:
+            root = os.path.join(folder_path, "")
+            gone = [doc for doc in known if doc.startswith(root) and doc not in status]
+            with self.conn:
+                self._remove(known[doc][0] for doc in gone)
+            status.update(dict.fromkeys(gone, "removed"))
+        return pd.DataFrame(list(status.items()), columns=["document", "status"])
+
+    def _insert(self, results, known, status) -> None:
+        for path, sha, texts in results:
+            if sha is None:
+                status[path] = "failed"
+                continue
+            with self.conn:
+                if path in known:
+                    self._remove([known[path][0]])
+                cur = self.conn.execute(
+                    "INSERT INTO documents (document, sha256, school, fiscal_year, pages) VALUES (?, ?, ?, ?, ?)",
+                    (path, sha, parse_school_from_path(path), parse_fiscal_year(path), len(texts)),
+                )
+                self.conn.executemany(
+                    "INSERT INTO page_fts (text, doc_id, page) VALUES (?, ?, ?)",
+                    [(text, cur.lastrowid, page) for page, text in enumerate(texts) if text],
+                )
+            status[path] = "indexed"
+
+    def search(self, query: str, school: Optional[str] = None, fiscal_year: Optional[int] = None,
+               limit: int = 50) -> pd.DataFrame:
+        """
+        Best-matching pages for an FTS5 `query` (bm25 rank, best first), optionally for one school / fiscal year.
+        `page` is 0-based like the rest of the pipeline; `snippet` marks the hits with [ ].
+        """
+        sql = (
+            "SELECT d.school, d.document, d.fiscal_year, page_fts.page, "
+            " snippet(page_fts, 0, '[', ']', ' ... ', 12) AS snippet, bm25(page_fts) AS rank "
+            "FROM page_fts JOIN documents d ON d.doc_id = page_fts.doc_id "
+            "WHERE page_fts MATCH ?"
+        )
+        params: list = [query]
+        if school is not None:
+            sql += " AND d.school = ?"
+            params.append(school)
+        if fiscal_year is not None:
+            sql += " AND d.fiscal_year = ?"
+            params.append(fiscal_year)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def documents(self) -> pd.DataFrame:
+        """One row per indexed document."""
+        return pd.read_sql_query(
+            "SELECT school, document, fiscal_year, pages, sha256 FROM documents ORDER BY school, document", self.conn
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Full-text search over the downloaded disclosure PDFs")
+    parser.add_argument("--index", default=INDEX_PATH, help="FTS5 index file")
+    parser.add_argument("--store", default=STORE_PATH, help="page text store ('' to read the PDFs directly)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="index new or changed PDFs under one or more folders")
+    build.add_argument("folders", nargs="+")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--no-prune", action="store_true", help="keep documents no longer on disk")
+
+    search = sub.add_parser("search", help="query the index")
+    search.add_argument("query")
+    search.add_argument("--school")
+    search.add_argument("--year", type=int)
+    search.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    index = FullTextIndex(args.index)
+    try:
+        if args.command == "build":
+            if args.store:
+                pdf_flagger.PAGE_TEXT_STORE = PageTextStore(args.store)
+            for folder in args.folders:
+                df = index.update(folder, workers=args.workers, prune=not args.no_prune)
+                print(f"{folder}: " + ", ".join(f"{n} {s}" for s, n in df["status"].value_counts().items()))
+        else:
+            try:
+                df = index.search(args.query, args.school, args.year, args.limit)
+            except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                print(f"Bad query {args.query!r}: {e}", file=sys.stderr)
+                return 2
+            for row in df.itertuples():
+                print(f"{row.school} | {os.path.basename(row.document)} | p.{row.page + 1} | {row.snippet}")
+            print(f"{len(df)} pages")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
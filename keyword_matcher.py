@@ -0,0 +1,129 @@
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Pattern characters that end a literal prefix; "?", "*" and "{" also make the previous character optional
+_META = set(".^$*+?{}[]\\|()")
+_MIN_ANCHOR = 3
+
+
+class KeywordHit(NamedTuple):
+    category: str
+    pattern: str
+    page: Optional[int]
+    start: int
+    end: int
+
+
+def _top_level_alternation(pattern: str) -> bool:
+    depth, i, in_class = 0, 0, False
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_anchor(pattern: str) -> Optional[str]:
+    """
+    Lower-cased literal text every match of `pattern` starts with, e.g. "financial statement" for
+    r"financial statements?", or None when the pattern has no usable literal prefix.
+    """
+    if _top_level_alternation(pattern):
+        return None
+    body = pattern[2:] if pattern.startswith(r"\b") else pattern
+    prefix = []
+    for c in body:
+        if c in _META:
+            if c in "?*{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(c)
+    anchor = "".join(prefix).lower()
+    return anchor if len(anchor) >= _MIN_ANCHOR else None
+
+
+class KeywordMatcher:
+    """
+    Matches all keyword categories (e.g. pdf_flagger.KEYWORDS) against one lower-cased copy of the text.
+
+    Each pattern's literal prefix is located with `str.find` (a C-speed substring scan), and the
+    compiled pattern is only tried at those positions. Patterns without a literal prefix are searched
+    normally. Hits are the same non-overlapping matches `re.finditer` returns per pattern.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], flags: int = re.IGNORECASE):
+        self.categories = list(keywords)
+        self._patterns: List[Tuple[str, str, "re.Pattern", Optional[str]]] = [
+            (category, p, re.compile(p, flags), literal_anchor(p) if flags & re.IGNORECASE else None)
+            for category, patterns in keywords.items()
+            for p in patterns
+        ]
+
+    def _finditer(self, compiled: "re.Pattern", anchor: Optional[str], text: str,
+                  lower: Optional[str]) -> Iterator[Tuple[int, int]]:
+        if anchor is None or lower is None:
+            for m in compiled.finditer(text):
+                yield m.start(), m.end()
+            return
+        last_end = 0
+        pos = lower.find(anchor)
+        while pos >= 0:
+            if pos >= last_end:
+                m = compiled.match(text, pos)
+                if m:
+                    yield m.start(), m.end()
+                    last_end = max(m.end(), pos + 1)
+            pos = lower.find(anchor, pos + 1)
+
+    @staticmethod
+    def _lower(text: str) -> Optional[str]:
+        # Positions in the lower-cased text only line up when lowering keeps the length
+        lower = text.lower()
+        return lower if len(lower) == len(text) else None
+
+    def finditer(self, text: str, page: Optional[int] = None) -> Iterator[KeywordHit]:
+        """Every keyword hit in `text`, pattern by pattern."""
+        text = text or ""
+        lower = self._lower(text)
+        for category, pattern, compiled, anchor in self._patterns:
+            for start, end in self._finditer(compiled, anchor, text, lower):
+                yield KeywordHit(category, pattern, page, start, end)
+
+    def flags(self, text: str) -> Dict[str, bool]:
+        """category -> whether any of its patterns occurs; stops at the first hit per category."""
+        text = text or ""
+        lower = self._lower(text)
+        found = dict.fromkeys(self.categories, False)
+        for category, _, compiled, anchor in self._patterns:
+            if not found[category]:
+                found[category] = next(self._finditer(compiled, anchor, text, lower), None) is not None
+        return found
+
+    def counts(self, text: str) -> Dict[str, Dict[str, int]]:
+        """category -> pattern -> number of hits."""
+        out = {category: {} for category in self.categories}
+        text = text or ""
+        lower = self._lower(text)
+        for category, pattern, compiled, anchor in self._patterns:
+            out[category][pattern] = sum(1 for _ in self._finditer(compiled, anchor, text, lower))
+        return out
+
+    def page_counts(self, pages: Sequence[Tuple[int, str]]) -> Dict[str, Dict[int, int]]:
+        """category -> page -> number of hits, for (page index, text) pairs. Pages without hits are left out."""
+        out: Dict[str, Dict[int, int]] = {category: {} for category in self.categories}
+        for page, text in pages:
+            for hit in self.finditer(text, page):
+                out[hit.category][page] = out[hit.category].get(page, 0) + 1
+        return out
@@ -0,0 +1,211 @@
+import os, re, logging, threading
+from typing import Any, Callable, List, Optional
+
+import pandas as pd
+from pypdf import PdfReader, PdfWriter
+
+from extraction_cache import file_sha256
+from pdf_flagger import KEYWORDS, extract_page_texts
+
+# Folder for the trimmed PDFs sent to the extractor (relative to the notebook's working directory)
+TRIM_DIR = ".trimmed_pdfs"
+TOP_K = 3            # best-scoring pages kept per document
+NEIGHBOURS = 1       # pages kept on each side of a selected page (statements often span 2 pages)
+TITLE_CHARS = 400    # a statement title in the first characters of a page is a page header
+TITLE_WEIGHT = 10
+MIN_AMOUNTS = 10     # statement pages are full of amounts; pages with fewer are down-weighted
+MIN_RATIO = 0.25     # pages scoring below this fraction of the best page are never selected
+# Set to a statement_index.StatementIndex to reuse precomputed page scores instead of rescoring the PDF
+STATEMENT_INDEX = None
+
+# Per statement type: "title" patterns identify the statement heading, "body" patterns its line items.
+STATEMENT_KEYWORDS = {
+    "financial_position": {
+        "title": [
+            r"statements? of financial position",
+            r"balance sheets?",
+            r"statements? of net position",
+        ],
+        "body": [
+            r"total assets",
+            r"total liabilities",
+            r"total net assets",
+            r"net assets without donor restrictions",
+            r"net assets with donor restrictions",
+            r"accumulated depreciation",
+            r"right[- ]of[- ]use",
+            r"lease liabilit(y|ies)",
+            r"bonds? payable",
+            r"postretirement|pension",
+        ],
+    },
+    "activities": {
+        "title": [
+            r"statements? of activities",
+            r"statements? of operations",
+            r"statements? of revenues?, expenses,? and changes in net (assets|position)",
+            r"statements? of changes in net assets",
+        ],
+        "body": [
+            r"tuition and fees",
+            r"financial aid|scholarships?",
+            r"total operating revenues?",
+            r"total (operating )?expenses",
+            r"net assets released from restrictions?",
+            r"auxiliary (enterprises|services)",
+            r"change in net assets",
+            r"investment (return|income)",
+        ],
+    },
+    "cash_flows": {
+        "title": [
+            r"statements? of cash flows?",
+        ],
+        "body": [
+            r"cash flows? from operating activities",
+            r"cash flows? from investing activities",
+            r"cash flows? from financing activities",
+            r"net cash (provided by|used in|from)",
+            r"depreciation and amortization",
+            r"purchases? of (property|land|buildings|equipment)",
+            r"(proceeds from|payments? on|repayments? of).{0,40}(debt|bonds?|notes?)",
+            r"net (increase|decrease|change) in cash",
+        ],
+    },
+    "endowment": {
+        "title": [
+            r"endowment",
+        ],
+        "body": [
+            r"endowment net assets",
+            r"board[- ]designated",
+            r"quasi[- ]endowment",
+            r"donor[- ]restricted endowment",
+            r"spending (policy|rate|formula)",
+            r"appropriat(ed|ion) for expenditure",
+            r"investment return",
+            r"underwater",
+        ],
+    },
+    "enrollment": {
+        "title": [
+            r"\benrollment\b",
+            r"admissions? statistics?",
+        ],
+        "body": KEYWORDS["Enrollment"] + [
+            r"headcount",
+            r"tuition,? (room|fees)",
+            r"acceptance|matriculat",
+            r"fall \d{4}",
+        ],
+    },
+}
+STATEMENT_KEYWORDS_COMPILED = {
+    statement: {part: [re.compile(p, re.IGNORECASE) for p in patterns] for part, patterns in parts.items()}
+    for statement, parts in STATEMENT_KEYWORDS.items()
+}
+
+_AMOUNT = re.compile(r"\(?\$?\s?\d{1,3}(,\d{3})+\)?")
+_CONTENTS = re.compile(r"table of contents|\bcontents\b", re.IGNORECASE)
+
+
+def score_page(text: str, statement: str) -> float:
+    """
+    Relevance of one page for `statement`.
+
+    A statement title in the page header is worth TITLE_WEIGHT, every line-item keyword hit adds one.
+    Pages with few amounts (narrative, notes prose) and table of contents pages are down-weighted.
+    """
+    if not text:
+        return 0.0
+    patterns = STATEMENT_KEYWORDS_COMPILED[statement]
+    header = text[:TITLE_CHARS]
+    score = TITLE_WEIGHT * sum(bool(p.search(header)) for p in patterns["title"])
+    score += sum(len(p.findall(text)) for p in patterns["body"])
+    if len(_AMOUNT.findall(text)) < MIN_AMOUNTS:
+        score *= 0.25
+    if _CONTENTS.search(header):
+        score *= 0.1
+    return float(score)
+
+
+def score_pages(pdf_path: str, statements: Optional[List[str]] = None) -> pd.DataFrame:
+    """One row per page, one score column per statement type (all types by default)."""
+    statements = statements or list(STATEMENT_KEYWORDS)
+    texts = extract_page_texts(pdf_path)
+    return pd.DataFrame(
+        {s: [score_page(t, s) for t in texts] for s in statements},
+        index=pd.RangeIndex(len(texts), name="page"),
+    )
+
+
+def select_pages(scores: pd.Series, top_k: int = TOP_K, neighbours: int = NEIGHBOURS,
+                 min_ratio: float = MIN_RATIO) -> List[int]:
+    """
+    Top `top_k` pages plus `neighbours` pages on each side, in page order.
+    Only pages scoring at least `min_ratio` times the best score are candidates.
+    """
+    if scores.empty or scores.max() <= 0:
+        return []
+    candidates = scores[scores >= min_ratio * scores.max()]
+    best = candidates.sort_values(ascending=False, kind="mergesort").head(top_k).index
+    keep = set()
+    for page in best:
+        keep.update(range(max(0, page - neighbours), min(len(scores), page + neighbours + 1)))
+    return sorted(keep)
+
+
+def write_trimmed_pdf(pdf_path: str, pages: List[int], out_path: str) -> str:
+    """Writes a PDF containing only `pages` (0-based, in the given order) of `pdf_path`."""
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(reader.pages[page])
+    folder = os.path.dirname(out_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # One temp file per writer: extraction threads may trim the same document for the same statement at once
+    tmp = f"{out_path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        writer.write(f)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def trim_pdf(pdf_path: str, statement: str, out_dir: str = TRIM_DIR,
+             top_k: int = TOP_K, neighbours: int = NEIGHBOURS) -> str:
+    """
+    Path of a trimmed copy of `pdf_path` holding only the pages relevant to `statement`.
+
+    Page scores come from STATEMENT_INDEX when it holds the PDF. Falls back to the original path when
+    no page scores (e.g. scanned PDFs without a text layer) or when the selection would keep the whole document.
+    """
+    try:
+        indexed = STATEMENT_INDEX.scores(pdf_path) if STATEMENT_INDEX is not None else None
+        scores = indexed[statement] if indexed is not None else score_pages(pdf_path, [statement])[statement]
+    except Exception as e:
+        logging.warning(f"Page scoring failed for {pdf_path}: {e}")
+        return pdf_path
+    pages = select_pages(scores, top_k, neighbours)
+    if not pages or len(pages) >= len(scores):
+        return pdf_path
+    out_name = f"{file_sha256(pdf_path)[:16]}_{statement}_{'-'.join(map(str, pages))}.pdf"
+    out_path = os.path.join(out_dir, out_name)
+    if not os.path.exists(out_path):
+        write_trimmed_pdf(pdf_path, pages, out_path)
+    logging.info(f"{os.path.basename(pdf_path)}: sending pages {[p + 1 for p in pages]} of {len(scores)}")
+    return out_path
+
+
+def trimmed_extractor(extract: Callable[[str], Any], statement: str, out_dir: str = TRIM_DIR,
+                      top_k: int = TOP_K, neighbours: int = NEIGHBOURS) -> Callable[[str], Any]:
+    """
+    Wraps `extract` (e.g. `agent.extract` or a cached extractor) so it receives the trimmed PDF.
+
+    Wrap the cache inside the trimmer (`trimmed_extractor(cache.cached(...), ...)`): the cache is then
+    keyed by the trimmed bytes, so changing the page selection never returns stale results.
+    """
+    def extract_trimmed(path: str) -> Any:
+        return extract(trim_pdf(path, statement, out_dir, top_k, neighbours))
+
+    return extract_trimmed
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+# Default location of the store, relative to the notebook's working directory
+STORE_PATH = ".page_text_store.sqlite"
+
+PDFPLUMBER_KIND = "pdfplumber"
+
+
+def ocr_kind(dpi: int, engine: str = "tesseract", version: str = "") -> str:
+    """
+    Extractor kind of OCR text. DPI, engine and engine version are part of the key,
+    so changing any of them makes the old OCR text invisible (see `PageTextStore.purge_kinds`).
+    """
+    return f"ocr:{engine}{'-' + version if version else ''}:{dpi}dpi"
+
+
+class PageTextStore:
+    """
+    SQLite store of page text keyed by (PDF sha256, page index, extractor kind).
+
+    Text is zlib-compressed. One connection is opened per process and thread, so the store can be
+    shared by the flagger's process pool and the extraction thread pool.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_text ("
+                " sha256 TEXT NOT NULL, page INTEGER NOT NULL, kind TEXT NOT NULL, text BLOB NOT NULL,"
+                " PRIMARY KEY (sha256, page, kind))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents (sha256 TEXT PRIMARY KEY, pages INTEGER NOT NULL)"
+            )
+
+    def __getstate__(self):
+        # Picklable for process pools: only the path travels, connections are reopened
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, counter: Dict[str, int], kind: str, n: int) -> None:
+        with self._lock:
+            counter[kind] = counter.get(kind, 0) + n
+
+    def page_count(self, sha256: str) -> Optional[int]:
+        row = self._conn().execute("SELECT pages FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+        return None if row is None else row[0]
+
+    def put_page_count(self, sha256: str, pages: int) -> None:
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?)", (sha256, pages))
+
+    def get(self, sha256: str, pages: Iterable[int], kind: str) -> Dict[int, str]:
+        """page -> text for the requested pages found in the store."""
+        pages = list(pages)
+        found = {}
+        for start in range(0, len(pages), 500):
+            chunk = pages[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT page, text FROM page_text WHERE sha256 = ? AND kind = ? "
+                f"AND page IN ({','.join('?' * len(chunk))})",
+                [sha256, kind, *chunk],
+            ).fetchall()
+            found.update({page: zlib.decompress(blob).decode("utf-8") for page, blob in rows})
+        self._count(self.hits, kind, len(found))
+        self._count(self.misses, kind, len(pages) - len(found))
+        return found
+
+    def put(self, sha256: str, texts: Dict[int, str], kind: str) -> None:
+        """Stores page -> text (empty strings too: "no text on this page" is worth remembering)."""
+        if not texts:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_text VALUES (?, ?, ?, ?)",
+                [(sha256, page, kind, zlib.compress(text.encode("utf-8"))) for page, text in texts.items()],
+            )
+
+    def purge_kinds(self, keep: List[str]) -> int:
+        """Deletes the text of every extractor kind not in `keep` (e.g. OCR at an old DPI). Returns rows removed."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"DELETE FROM page_text WHERE kind NOT IN ({','.join('?' * len(keep))})", keep
+            )
+            return cur.rowcount
+
+    def invalidate(self, sha256: Optional[str] = None, kind: Optional[str] = None) -> int:
+        """Deletes the stored text of one document and/or one extractor kind (everything if both are None)."""
+        clauses, params = [], []
+        if sha256 is not None:
+            clauses.append("sha256 = ?")
+            params.append(sha256)
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._conn() as conn:
+            return conn.execute(f"DELETE FROM page_text{where}", params).rowcount
+
+    def stats(self) -> pd.DataFrame:
+        """Per extractor kind: stored documents, pages and compressed bytes, plus hits/misses counted in this process."""
+        df = pd.read_sql_query(
+            "SELECT kind, COUNT(DISTINCT sha256) AS documents, COUNT(*) AS pages, SUM(LENGTH(text)) AS bytes "
+            "FROM page_text GROUP BY kind",
+            self._conn(),
+        ).set_index("kind")
+        kinds = sorted(set(df.index) | set(self.hits) | set(self.misses))
+        df = df.reindex(kinds).fillna(0).astype(int)
+        df["hits"] = [self.hits.get(k, 0) for k in kinds]
+        df["misses"] = [self.misses.get(k, 0) for k in kinds]
+        return df
@@ -0,0 +1,222 @@
+"""
+Content-addressed store for the downloaded PDFs: every distinct file is kept once, as
+<root>/<sha256[:2]>/<sha256>.pdf, and the school folders (scrapping/university_pdfs,
+private_universities/university_pdfs, the samples, university_pdfs_hy*) hold hard links to it.
+The same ACFR attached to several CUSIPs of one obligor, or copied between roots, then takes its
+size on disk once. Where hard links are impossible (another file system) a symlink is made instead.
+
+Linked copies share an inode, so the store knows their hash from a stat call: re-running `dedupe`
+only hashes new files, and extraction_cache.file_sha256 hashes each shared file once per process.
+Files are replaced, never written in place (downloads go to a .part file and os.replace), so a new
+download under one path never changes the other copies.
+
+    python pdf_blob_store.py dedupe scrapping/university_pdfs private_universities/university_pdfs --report dedup_report.csv
+"""
+import argparse
+import errno
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from tqdm import tqdm
+
+from extraction_cache import file_sha256
+
+BLOB_DIR = ".pdf_blobs"   # default store location, relative to the working directory
+HASH_WORKERS = 8          # threads hashing files in dedupe
+
+# Link modes
+HARDLINK, SYMLINK = "hardlink", "symlink"
+
+# Statuses of a file after `add`
+STORED, LINKED, ALREADY_LINKED, SYMLINKED, KEPT = "stored", "linked", "already_linked", "symlinked", "kept"
+
+REPORT_COLUMNS = ["path", "sha256", "bytes", "status", "copies", "error"]
+
+
+def list_pdfs(roots: Iterable[str], skip: Optional[str] = None) -> List[str]:
+    """PDF paths under `roots` (symlinks included), leaving out the folder `skip` (the store itself)."""
+    skip = os.path.realpath(skip) if skip else None
+    paths = []
+    for root in roots:
+        for dirpath, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if os.path.realpath(os.path.join(dirpath, d)) != skip]
+            paths.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(".pdf"))
+    return paths
+
+
+class BlobStore:
+    """
+    PDFs by SHA-256 under `root`, linked into the school folders with `link` (HARDLINK or SYMLINK).
+
+        store = BlobStore("../.pdf_blobs")
+        report = store.dedupe(["university_pdfs", "../private_universities/university_pdfs"])
+    """
+
+    def __init__(self, root: str = BLOB_DIR, link: str = HARDLINK):
+        if link not in (HARDLINK, SYMLINK):
+            raise ValueError(f"link must be {HARDLINK!r} or {SYMLINK!r}, not {link!r}")
+        self.root = root
+        self.link = link
+        os.makedirs(root, exist_ok=True)
+        self._inodes: Optional[Dict[Tuple[int, int], str]] = None
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def inodes(self) -> Dict[Tuple[int, int], str]:
+        """(st_dev, st_ino) -> sha256 of every blob: a file sharing an inode with a blob has its hash."""
+        if self._inodes is None:
+            self._inodes = {}
+            for path in list_pdfs([self.root]):
+                st = os.stat(path)
+                self._inodes[(st.st_dev, st.st_ino)] = os.path.splitext(os.path.basename(path))[0]
+        return self._inodes
+
+    def known_sha256(self, path: str) -> Optional[str]:
+        """Hash of `path` if it is already a link to a blob (a stat call, no read)."""
+        st = os.stat(path)
+        return self.inodes().get((st.st_dev, st.st_ino))
+
+    def _replace_with_link(self, blob: str, path: str) -> str:
+        tmp = f"{path}.blob.tmp"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        if self.link == HARDLINK:
+            try:
+                os.link(blob, tmp)
+                os.replace(tmp, path)
+                return LINKED
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        os.symlink(os.path.abspath(blob), tmp)
+        os.replace(tmp, path)
+        return SYMLINKED
+
+    def add(self, path: str, sha256: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Puts the file at `path` in the store and makes `path` a link to its blob.
+        Returns (sha256, status): STORED (first copy, now the blob), LINKED / SYMLINKED (a duplicate,
+        replaced by a link) or ALREADY_LINKED.
+        """
+        sha256 = sha256 or self.known_sha256(path) or file_sha256(path)
+        blob = self.blob_path(sha256)
+        st = os.stat(path)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            linked = False
+            if self.link == HARDLINK:
+                try:
+                    os.link(os.path.realpath(path), blob)   # the file itself becomes the blob, nothing is copied
+                    linked = True
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+            if not linked:
+                # Symlink mode, or another file system: copy it in and link back
+                shutil.copyfile(path, f"{blob}.tmp")
+                os.replace(f"{blob}.tmp", blob)
+                self._replace_with_link(blob, path)
+                st = os.stat(blob)
+            self.inodes()[(st.st_dev, st.st_ino)] = sha256
+            return sha256, STORED
+        blob_st = os.stat(blob)
+        if (st.st_dev, st.st_ino) == (blob_st.st_dev, blob_st.st_ino):
+            return sha256, ALREADY_LINKED
+        return sha256, self._replace_with_link(blob, path)
+
+    def dedupe(self, roots: Iterable[str], workers: int = HASH_WORKERS,
+               report_path: Optional[str] = None) -> pd.DataFrame:
+        """
+        Adds every PDF under `roots` to the store, so identical files share one blob.
+        Returns the report: one row per path with its sha256, bytes, status and the number of copies
+        of the same content found; optionally saved to `report_path`.
+        """
+        paths = list_pdfs(roots, skip=self.root)
+
+        def disk_bytes() -> int:
+            seen = {}
+            for p in paths:
+                st = os.stat(p)
+                seen[(st.st_dev, st.st_ino)] = st.st_size
+            return sum(seen.values())
+
+        before = disk_bytes()
+
+        # Hash what is not linked yet, each inode once (files already hard-linked to each other included)
+        first_path: Dict[Tuple[int, int], str] = {}
+        for p in paths:
+            st = os.stat(p)
+            if (st.st_dev, st.st_ino) not in self.inodes():
+                first_path.setdefault((st.st_dev, st.st_ino), p)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = dict(zip(first_path, tqdm(pool.map(file_sha256, first_path.values()),
+                                               total=len(first_path), desc="Hashing PDFs")))
+
+        rows = []
+        for p in paths:
+            st = os.stat(p)
+            row = {"path": p, "bytes": st.st_size, "error": None}
+            try:
+                row["sha256"], row["status"] = self.add(p, hashes.get((st.st_dev, st.st_ino)))
+            except OSError as e:
+                row["sha256"], row["status"], row["error"] = hashes.get((st.st_dev, st.st_ino)), KEPT, str(e)
+                print(f"Jump: {p}: {e}")
+            rows.append(row)
+        report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+        report["copies"] = report.groupby("sha256")["path"].transform("size").fillna(1).astype(int)
+
+        after = disk_bytes()
+        print(f"{len(report)} PDFs, {report['sha256'].nunique()} distinct: {before / 2**20:.1f} MB on disk "
+              f"before, {after / 2**20:.1f} MB after ({(before - after) / 2**20:.1f} MB saved)")
+        if report_path:
+            report.sort_values(["copies", "sha256"], ascending=[False, True]).to_csv(report_path, index=False)
+        return report
+
+    def prune(self, roots: Iterable[str] = ()) -> int:
+        """
+        Removes blobs nothing links to any more (link count 1 and no symlink under `roots` pointing
+        at them), e.g. after a school folder was deleted. Returns the number of blobs removed.
+        """
+        targets = {os.path.realpath(p) for p in list_pdfs(roots, skip=self.root) if os.path.islink(p)}
+        removed = 0
+        for blob in list_pdfs([self.root]):
+            if os.stat(blob).st_nlink == 1 and os.path.realpath(blob) not in targets:
+                os.remove(blob)
+                removed += 1
+        self._inodes = None
+        return removed
+
+    def report(self) -> Dict[str, int]:
+        """Blob count and total size."""
+        blobs = list_pdfs([self.root])
+        return {"blobs": len(blobs), "bytes": sum(os.path.getsize(b) for b in blobs)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Deduplicate downloaded PDFs into a content-addressed store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dedupe = sub.add_parser("dedupe", help="link identical PDFs under the given folders to one stored copy")
+    dedupe.add_argument("roots", nargs="+")
+    dedupe.add_argument("--store", default=BLOB_DIR)
+    dedupe.add_argument("--link", choices=[HARDLINK, SYMLINK], default=HARDLINK)
+    dedupe.add_argument("--workers", type=int, default=HASH_WORKERS)
+    dedupe.add_argument("--report", default=None, help="CSV path for the per-file report")
+    prune = sub.add_parser("prune", help="remove stored PDFs no folder links to any more")
+    prune.add_argument("roots", nargs="*", help="folders whose symlinks still count as references")
+    prune.add_argument("--store", default=BLOB_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "dedupe":
+        BlobStore(args.store, args.link).dedupe(args.roots, args.workers, args.report)
+    else:
+        print(f"{BlobStore(args.store).prune(args.roots)} unreferenced PDFs removed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
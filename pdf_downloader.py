@@ -0,0 +1,318 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+from rate_limiter import HostRateLimiter, RateLimitedAdapter
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+    )
+}
+TIMEOUT = 20                  # seconds to connect / between bytes of a response
+DOWNLOAD_WORKERS = 8          # concurrent HTTP downloads (also the connection pool size)
+CHUNK_SIZE = 1 << 16          # bytes written per chunk while streaming a PDF to disk
+RESUME_ATTEMPTS = 5           # Range requests to resume one dropped download before giving up
+BROWSER_TIMEOUT = 60          # seconds to wait for a Chrome download to finish
+POLL_INTERVAL = 0.2
+TMP_DIR = Path("__tmp_downloads")
+
+# Download statuses
+EXISTS, HTTP, BROWSER, NEEDS_BROWSER, FAILED = "exists", "http", "browser", "needs_browser", "failed"
+
+
+class DownloadResult(NamedTuple):
+    credit: str
+    document_name: str
+    pdf_url: str
+    path: str
+    status: str
+    bytes: int = 0
+    error: Optional[str] = None
+
+
+def slugify(text):
+    return re.sub(r"[^\w\-. ]", "_", text).strip().replace(" ", "_")
+
+
+def target_path(root_dir: Path, credit: str, document_name: str, url: str) -> Path:
+    """<root_dir>/<CREDIT slug>/<document name slug><url extension>, as the scraper has always named files."""
+    ext = Path(urlparse(url).path).suffix or ".pdf"
+    return Path(root_dir) / slugify(credit) / f"{slugify(document_name)}{ext}"
+
+
+def make_session(pool_size: int = DOWNLOAD_WORKERS, retries: int = 3,
+                 limiter: Optional[HostRateLimiter] = None) -> requests.Session:
+    """
+    Keep-alive session shared by the download threads: one connection pool of `pool_size` per host,
+    with retries and backoff on connection errors, 429 and 5xx.
+
+    With a `limiter` every request first takes a token from its host's adaptive bucket, and 429 / 5xx
+    answers are retried by rate_limiter.RateLimitedAdapter instead, so they also slow the host down.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    if limiter is not None:
+        retry = Retry(total=retries, backoff_factor=1.0, status_forcelist=[], allowed_methods=["GET", "HEAD"],
+                      respect_retry_after_header=False)
+        adapter = RateLimitedAdapter(limiter, retries=retries, pool_connections=4, pool_maxsize=pool_size,
+                                     max_retries=retry)
+    else:
+        retry = Retry(total=retries, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["GET", "HEAD"], respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _content_range(header: str) -> Tuple[Optional[int], Optional[int]]:
+    """(first byte, total size) of a `Content-Range: bytes a-b/total` header; None for unknown parts."""
+    m = re.match(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", header or "")
+    if not m:
+        return None, None
+    first, total = m.groups()
+    return (int(first) if first else None), (int(total) if total != "*" else None)
+
+
+def download_via_requests(session: requests.Session, url: str, dest_path: Path,
+                          chunk_size: int = CHUNK_SIZE,
+                          attempts: int = RESUME_ATTEMPTS) -> Tuple[str, int, Optional[str]]:
+    """
+    Streams `url` to `dest_path` through a .part file, so a partial download never looks finished.
+
+    A dropped connection or a read timeout does not start the file over: the download is resumed with
+    a Range request from the bytes already in the .part file, up to `attempts` times in this call. The
+    .part file and the server's validator (ETag / Last-Modified, in a .part.validator file next to it)
+    are kept when the call gives up, so the next run resumes too; If-Range makes the server send the
+    whole file again if it changed in between. The file is only renamed into place once its size
+    matches the length the server announced. The file is asked for without content encoding (byte
+    ranges and lengths are those of the encoded body otherwise); a server that compresses it anyway
+    gets no length check, as requests writes the decoded bytes.
+
+    Returns (status, bytes, error). 403s and HTML pages in place of a PDF (EMMA's disclaimer page)
+    come back as NEEDS_BROWSER, as they are the only case the Chrome fallback can fix.
+    """
+    part = dest_path.with_name(dest_path.name + ".part")
+    validator_file = part.with_name(part.name + ".validator")
+    validator = validator_file.read_text() if validator_file.exists() and part.exists() else None
+    error = None
+    for attempt in range(attempts + 1):
+        have = part.stat().st_size if part.exists() else 0
+        headers = {"Accept-Encoding": "identity"}
+        if have:
+            headers["Range"] = f"bytes={have}-"
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            with session.get(url, stream=True, timeout=TIMEOUT, headers=headers) as r:
+                if r.status_code == 403:
+                    return NEEDS_BROWSER, 0, "HTTP 403"
+                if r.status_code == 416:
+                    # Nothing left to send: the .part file is complete, or not this file at all
+                    _, total = _content_range(r.headers.get("Content-Range"))
+                    if total == have:
+                        break
+                    part.unlink()
+                    error = "HTTP 416 for a stale partial file"
+                    continue
+                r.raise_for_status()
+                if "text/html" in r.headers.get("Content-Type", ""):
+                    return NEEDS_BROWSER, 0, "HTML page instead of a PDF"
+                if r.status_code == 206:
+                    first, total = _content_range(r.headers.get("Content-Range"))
+                    if first != have:
+                        part.unlink()
+                        error = f"asked for bytes {have}-, got {r.headers.get('Content-Range')}"
+                        continue
+                    mode = "ab"
+                else:
+                    # Full body: no partial file yet, Range not supported, or the file changed (If-Range)
+                    total = int(r.headers["Content-Length"]) if "Content-Length" in r.headers else None
+                    have, mode = 0, "wb"
+                    validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+                    dest_path.parent.mkdir(parents=True, exist_ok=True)
+                    if validator:
+                        validator_file.write_text(validator)
+                    elif validator_file.exists():
+                        validator_file.unlink()
+                if r.headers.get("Content-Encoding", "identity").lower() not in ("", "identity"):
+                    total = None
+                with open(part, mode) as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+            size = part.stat().st_size
+            if total is None or size == total:
+                break
+            error = f"connection closed at {size} of {total} bytes"
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            # Dropped or stalled mid-stream: resume from what reached the .part file
+            error = str(e)
+        except Exception as e:
+            print(f"[requests fail] {url} → {e}")
+            return FAILED, 0, str(e)
+        if attempt < attempts:
+            print(f"[resume] {url}: {error}; resuming at byte {part.stat().st_size if part.exists() else 0}")
+    else:
+        print(f"[requests fail] {url} → {error}")
+        return FAILED, 0, error
+
+    os.replace(part, dest_path)
+    if validator_file.exists():
+        validator_file.unlink()
+    return HTTP, dest_path.stat().st_size, None
+
+
+def setup_browser(download_dir: Path):
+    # Selenium is only needed for the fallback, so it is imported here
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_opts = Options()
+    # REMOVE HEADLESS TO SEE WHAT’S HAPPENING
+    # chrome_opts.add_argument("--headless")
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-gpu")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+    chrome_opts.add_experimental_option("prefs", {
+        "download.default_directory": str(Path(download_dir).resolve()),
+        "download.prompt_for_download": False,
+        "plugins.always_open_pdf_externally": True,  # Don't render PDF in-browser
+    })
+    return webdriver.Chrome(options=chrome_opts)
+
+
+def wait_for_download(download_dir: Path, timeout: float = BROWSER_TIMEOUT,
+                      poll: float = POLL_INTERVAL) -> Optional[Path]:
+    """
+    The PDF Chrome finished downloading into `download_dir`, or None after `timeout` seconds.
+    A download is finished when no .crdownload / .tmp file is left and the PDF's size has stopped changing.
+    """
+    deadline = time.monotonic() + timeout
+    last_size = -1
+    while time.monotonic() < deadline:
+        in_progress = [p for p in download_dir.glob("*") if p.suffix in (".crdownload", ".tmp")]
+        pdfs = list(download_dir.glob("*.pdf"))
+        if pdfs and not in_progress:
+            newest = max(pdfs, key=os.path.getctime)
+            size = newest.stat().st_size
+            if size > 0 and size == last_size:
+                return newest
+            last_size = size
+        time.sleep(poll)
+    return None
+
+
+def download_via_chrome(driver, url: str, dest_path: Path, download_dir: Path = TMP_DIR,
+                        timeout: float = BROWSER_TIMEOUT) -> Tuple[str, int, Optional[str]]:
+    download_dir.mkdir(exist_ok=True)
+    for f in download_dir.glob("*"):
+        f.unlink()
+    try:
+        driver.get(url)
+        pdf_file = wait_for_download(download_dir, timeout)
+        if pdf_file is None:
+            print(f"[chrome fail] No PDF found for {url}")
+            return FAILED, 0, f"no download within {timeout}s"
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        size = pdf_file.stat().st_size
+        os.replace(pdf_file, dest_path)
+        return BROWSER, size, None
+    except Exception as e:
+        print(f"[chrome error] {url} → {e}")
+        return FAILED, 0, str(e)
+
+
+def copy_browser_cookies(driver, session: requests.Session) -> None:
+    """Gives the HTTP session the cookies Chrome holds (e.g. an accepted EMMA disclaimer)."""
+    for c in driver.get_cookies():
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+
+
+def download_pdfs(df: pd.DataFrame,
+                  root_dir: Path,
+                  workers: int = DOWNLOAD_WORKERS,
+                  browser_fallback: bool = True,
+                  download_dir: Path = TMP_DIR,
+                  failed_log_path: Optional[str] = None,
+                  make_browser: Callable[[Path], object] = setup_browser,
+                  skip_existing: bool = True,
+                  limiter: Optional[HostRateLimiter] = None) -> pd.DataFrame:
+    """
+    Downloads every (CREDIT, document_name, pdf_url) row of `df` into <root_dir>/<CREDIT>/.
+
+    Files already on disk are skipped unless `skip_existing` is False (a download then replaces the file
+    atomically). All other rows are fetched over one pooled HTTP session by `workers` threads. Only rows
+    the server refused to serve as a PDF go through Chrome; it is started once, on demand, and after its
+    first download its cookies are handed to the HTTP session, so the remaining refused rows are tried
+    over HTTP again before falling back to Chrome.
+
+    Returns one DownloadResult row per input row; failed rows are also written to `failed_log_path`.
+    A shared `limiter` (rate_limiter.HostRateLimiter) paces the HTTP requests per host.
+    """
+    rows = df.dropna(subset=["CREDIT", "pdf_url", "document_name"])
+    results: Dict[int, DownloadResult] = {}
+    jobs = []
+    for i, row in enumerate(rows.itertuples(index=False)):
+        target = target_path(root_dir, row.CREDIT, row.document_name, row.pdf_url)
+        if skip_existing and target.exists():
+            results[i] = DownloadResult(row.CREDIT, row.document_name, row.pdf_url, str(target), EXISTS,
+                                        target.stat().st_size)
+        else:
+            jobs.append((i, row, target))
+    print(f"{len(results)} of {len(rows)} documents already downloaded; fetching {len(jobs)}")
+
+    session = make_session(pool_size=workers, limiter=limiter)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(download_via_requests, session, row.pdf_url, target): (i, row, target)
+                   for i, row, target in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="HTTP downloads"):
+            i, row, target = futures[future]
+            status, size, error = future.result()
+            results[i] = DownloadResult(row.CREDIT, row.document_name, row.pdf_url, str(target), status, size, error)
+
+    refused = [(i, row, target) for i, row, target in jobs if results[i].status == NEEDS_BROWSER]
+    if refused and browser_fallback:
+        driver, have_cookies = None, False
+        try:
+            for i, row, target in tqdm(refused, desc="Browser downloads"):
+                if have_cookies:
+                    status, size, error = download_via_requests(session, row.pdf_url, target)
+                    if status == HTTP:
+                        results[i] = results[i]._replace(status=status, bytes=size, error=None)
+                        continue
+                if driver is None:
+                    driver = make_browser(download_dir)
+                print(f"[Fallback → Chrome UI] {row.pdf_url}")
+                status, size, error = download_via_chrome(driver, row.pdf_url, target, download_dir)
+                results[i] = results[i]._replace(status=status, bytes=size, error=error)
+                if status == BROWSER and not have_cookies:
+                    copy_browser_cookies(driver, session)
+                    have_cookies = True
+        finally:
+            if driver is not None:
+                driver.quit()
+            if download_dir.exists():
+                for f in download_dir.glob("*"):
+                    f.unlink()
+                download_dir.rmdir()
+
+    out = pd.DataFrame([results[i] for i in sorted(results)], columns=DownloadResult._fields)
+    out.loc[out["status"] == NEEDS_BROWSER, "status"] = FAILED
+    failed = out[out["status"] == FAILED]
+    if failed_log_path and not failed.empty:
+        failed.rename(columns={"credit": "CREDIT"})[["CREDIT", "document_name", "pdf_url", "error"]].to_csv(
+            failed_log_path, index=False)
+        print(f"\nLogged {len(failed)} failed downloads to {failed_log_path}")
+    return out
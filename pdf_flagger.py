@@ -0,0 +1,351 @@
+import os, re, logging
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Dict
+import pandas as pd
+
+from extraction_cache import file_sha256
+from keyword_matcher import KeywordMatcher
+from page_text_store import PDFPLUMBER_KIND, PageTextStore, ocr_kind
+
+# OCR
+_OCR_AVAILABLE = True
+try:
+    import fitz  # PyMuPDF
+    from PIL import Image
+    import pytesseract
+except Exception:
+    _OCR_AVAILABLE = False
+
+try:
+    import pdfplumber
+except Exception as e:
+    raise RuntimeError("Miss: pdfplumber")
+
+NUM_FIRST_PAGES = 30
+NUM_LAST_PAGES  = 30
+ENABLE_OCR      = True
+OCR_DPI         = 300
+FLAG_WORKERS    = os.cpu_count() or 1  # process pool size for build_flag_df(workers=...)
+PAGE_THRESHOLD  = 5  # Step 3: documents with fewer pages are not treated as financial statements
+# Set to a PageTextStore to reuse pdfplumber / OCR page text across runs (re-flagging becomes a text scan)
+PAGE_TEXT_STORE: Optional[PageTextStore] = None
+
+KEYWORDS = {
+    "FS": [
+        r"financial statements?",
+        r"annual financial report",
+        r"financial report",
+        r"financial position",
+        r"statement of activities",
+        r"statement of cash flows?",
+        r"net (revenue|revenues)",
+        r"net assets?",
+        r"audited financial",
+        r"management discussion and analysis",
+    ],
+    "Enrollment": [
+        r"\benrollment\b",
+        r"\bfte\b",  # full-time equivalent
+        r"student headcount",
+        r"admissions? report",
+        r"enrolled students?",
+        r"undergraduate enrollment",
+        r"graduate enrollment",
+        r"full-time equivalents?",   #add
+        r"enrollments and degrees",   #add
+        r"admissions? statistics?"
+    ],
+}
+KEYWORDS_COMPILED = {k: [re.compile(p, re.IGNORECASE) for p in v] for k, v in KEYWORDS.items()}
+# All categories matched together; rebuild it (KeywordMatcher(KEYWORDS)) after editing KEYWORDS
+KEYWORD_MATCHER = KeywordMatcher(KEYWORDS)
+
+
+def parse_school_from_path(pdf_path: str) -> str:
+    return os.path.basename(os.path.dirname(pdf_path))
+
+@lru_cache(maxsize=1)
+def _ocr_engine_version() -> str:
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return ""
+
+def current_ocr_kind() -> str:
+    """Store key of OCR text produced with the current engine and OCR_DPI."""
+    return ocr_kind(OCR_DPI, "tesseract", _ocr_engine_version() if _OCR_AVAILABLE else "")
+
+def _ocr_page_texts(pdf_path: str, page_numbers: List[int], sha256: Optional[str] = None) -> Dict[int, str]:
+    """page -> OCR text for `page_numbers` (empty if OCR is unavailable or fails), through PAGE_TEXT_STORE."""
+    if not (_OCR_AVAILABLE and ENABLE_OCR):
+        return {}
+    store = PAGE_TEXT_STORE
+    kind = current_ocr_kind() if store is not None else ""
+    if store is not None and sha256 is None:
+        sha256 = file_sha256(pdf_path)
+    texts: Dict[int, str] = store.get(sha256, set(page_numbers), kind) if store is not None else {}
+    try:
+        missing = [p for p in dict.fromkeys(page_numbers) if p not in texts]
+        if missing:
+            new_texts: Dict[int, str] = {}
+            doc = fitz.open(pdf_path)
+            for pno in missing:
+                if pno < 0 or pno >= len(doc):
+                    continue
+                page = doc.load_page(pno)
+                zoom = OCR_DPI / 72.0
+                mat = fitz.Matrix(zoom, zoom)
+                pix = page.get_pixmap(matrix=mat)
+                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                try:
+                    new_texts[pno] = pytesseract.image_to_string(img)
+                except Exception:
+                    pass
+            doc.close()
+            if store is not None:
+                store.put(sha256, new_texts, kind)
+            texts.update(new_texts)
+    except Exception as e:
+        logging.debug(f"OCR wrong: {e}")
+        return {}
+    return texts
+
+def _ocr_pages(pdf_path: str, page_numbers: List[int], sha256: Optional[str] = None) -> str:
+    texts = _ocr_page_texts(pdf_path, page_numbers, sha256)
+    return "\n".join(texts[pno] for pno in page_numbers if texts.get(pno))
+
+def _page_texts(pdf_path: str, sha256: Optional[str], select_pages) -> Tuple[int, Dict[int, str]]:
+    """
+    (page count, page -> pdfplumber text) for the pages `select_pages(page_count)` returns.
+
+    Goes through PAGE_TEXT_STORE when it is set: the PDF is only opened if the page count or some
+    of the pages are not stored yet, and only the missing pages are extracted.
+    """
+    store = PAGE_TEXT_STORE
+    texts: Dict[int, str] = {}
+    total = store.page_count(sha256) if store is not None else None
+    if total is not None:
+        texts = store.get(sha256, select_pages(total), PDFPLUMBER_KIND)
+        if len(texts) == len(set(select_pages(total))):
+            return total, texts
+    new_texts: Dict[int, str] = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        total = len(pdf.pages)
+        for i in select_pages(total):
+            if i in texts or i in new_texts:
+                continue
+            try:
+                new_texts[i] = (pdf.pages[i].extract_text() or "").strip()
+            except Exception:
+                pass
+    if store is not None:
+        store.put_page_count(sha256, total)
+        store.put(sha256, new_texts, PDFPLUMBER_KIND)
+    texts.update(new_texts)
+    return total, texts
+
+def extract_page_texts(pdf_path: str, pages: Optional[List[int]] = None) -> List[str]:
+    """Stripped text of every page (or of `pages` only, others left empty), indexed by page number."""
+    sha256 = file_sha256(pdf_path) if PAGE_TEXT_STORE is not None else None
+    total, texts = _page_texts(
+        pdf_path, sha256,
+        lambda n: list(range(n)) if pages is None else [i for i in pages if 0 <= i < n],
+    )
+    return [texts.get(i, "") for i in range(total)]
+
+def classify_flags(text: str) -> Dict[str, bool]:
+    flags = KEYWORD_MATCHER.flags(text or "")
+    fs_hit, enroll_hit = flags["FS"], flags["Enrollment"]
+    other = (not fs_hit and not enroll_hit)   # ← removed bool(txt.strip())
+    return {"FS": fs_hit, "Enrollment": enroll_hit, "Other": other}
+
+# Per-document metadata collected by scan_document and carried through Steps 1-3
+META_COLUMNS = ["page", "has_text_layer", "page_text_lengths", "bytes", "sha256"]
+# Step 1 column with the per-page keyword hit counts behind the flags: {category: {page: hits}}
+KEYWORD_HITS_COLUMN = "keyword_hits"
+
+def first_and_last_pages(total: int, first_n: int = NUM_FIRST_PAGES, last_m: int = NUM_LAST_PAGES) -> List[int]:
+    """The first `first_n` and last `last_m` pages of a `total`-page document, without overlap."""
+    n_first = min(first_n, total)
+    n_last  = min(last_m, total - n_first) if total > n_first else 0
+    return list(range(n_first)) + list(range(max(0, total - n_last), total))
+
+def scan_document(pdf_path: str, first_n: int = NUM_FIRST_PAGES, last_m: int = NUM_LAST_PAGES) -> Dict:
+    """
+    Single pass over one PDF: the Step 1 text (first / last pages, OCR when they have no text layer) plus its metadata.
+
+    pdfplumber opens the file once for the page count and the first/last page text; fitz only opens it
+    for the OCR fallback. With PAGE_TEXT_STORE set, pages already stored are not extracted again.
+    `page_text_lengths` maps each page read to the length of its text layer.
+    """
+    size = os.path.getsize(pdf_path)
+    sha = file_sha256(pdf_path)
+
+    def first_and_last(total: int) -> List[int]:
+        return first_and_last_pages(total, first_n, last_m)
+
+    total, texts = _page_texts(pdf_path, sha, first_and_last)
+    page_texts = [(i, texts[i]) for i in first_and_last(total) if texts.get(i)]
+    lengths = {i: len(texts[i]) for i in first_and_last(total) if i in texts}
+    text = "\n".join(t for _, t in page_texts)
+    has_text_layer = bool(text.strip())
+    if not has_text_layer and _OCR_AVAILABLE and ENABLE_OCR:
+        front = list(range(min(first_n, total)))
+        tail  = list(range(max(0, total - last_m), total))
+        ocr_texts = _ocr_page_texts(pdf_path, front + tail, sha)
+        page_texts = [(i, ocr_texts[i]) for i in front + tail if ocr_texts.get(i)]
+        text = "\n".join(t for _, t in page_texts)
+    return {
+        "text": text,
+        "page_texts": page_texts,
+        "page": total,
+        "has_text_layer": has_text_layer,
+        "page_text_lengths": lengths,
+        "bytes": size,
+        "sha256": sha,
+    }
+
+def list_pdfs(folder_path: str) -> List[str]:
+    """PDF paths under `folder_path`, in os.walk order (the order of the flag CSV)."""
+    paths = []
+    for root, dirs, files in os.walk(folder_path):
+        for fname in files:
+            if fname.lower().endswith(".pdf"):
+                paths.append(os.path.join(root, fname))
+    return paths
+
+def flag_document(fpath: str, first_n: int = NUM_FIRST_PAGES, last_m: int = NUM_LAST_PAGES) -> Optional[Dict]:
+    """Step 1 record of one PDF (flags + metadata), or None if it could not be read."""
+    try:
+        scan = scan_document(fpath, first_n, last_m)
+        flags = classify_flags(scan["text"])
+        school = parse_school_from_path(fpath)
+        return {
+            "school": school,
+            "document": fpath,
+            **flags,
+            **{c: scan[c] for c in META_COLUMNS},
+            KEYWORD_HITS_COLUMN: KEYWORD_MATCHER.page_counts(scan["page_texts"]),
+        }
+    except Exception as e:
+        logging.warning(f"Jump: {fpath}: {e}")
+        return None
+
+def _init_flag_worker(enable_ocr: bool, ocr_dpi: int, page_text_store: Optional[PageTextStore]) -> None:
+    # Worker processes may be spawned (macOS/Windows) and re-import this module: carry the notebook's settings over
+    global ENABLE_OCR, OCR_DPI, PAGE_TEXT_STORE
+    ENABLE_OCR, OCR_DPI, PAGE_TEXT_STORE = enable_ocr, ocr_dpi, page_text_store
+
+def _flag_document_args(args: Tuple[str, int, int]) -> Optional[Dict]:
+    return flag_document(*args)
+
+def build_flag_df(folder_path: str, first_n: int = NUM_FIRST_PAGES, last_m: int = NUM_LAST_PAGES,
+                  workers: int = 1, chunksize: int = 4) -> pd.DataFrame:
+    """
+    Step 1 flags for every PDF under `folder_path`, followed by the META_COLUMNS of each document
+    and its per-page keyword hit counts (KEYWORD_HITS_COLUMN).
+
+    With `workers` > 1 the documents are fanned out over a process pool, `chunksize` documents per task.
+    Records are streamed back in os.walk order, so the output is identical to the serial path.
+    """
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"Directory not found: {folder_path} (please check your working directory and path)")
+    paths = list_pdfs(folder_path)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_flag_worker,
+                                 initargs=(ENABLE_OCR, OCR_DPI, PAGE_TEXT_STORE)) as pool:
+            results = pool.map(_flag_document_args, [(p, first_n, last_m) for p in paths], chunksize=chunksize)
+            records = [r for r in results if r is not None]
+    else:
+        records = [r for r in (flag_document(p, first_n, last_m) for p in paths) if r is not None]
+    logging.info(f"Number of PDF file:{len(paths)}, Success record:{len(records)}")
+    df = pd.DataFrame(records, columns=["school", "document", "FS", "Enrollment", "Other"] + META_COLUMNS
+                      + [KEYWORD_HITS_COLUMN])
+    return df
+
+
+# ===== Step 2: Same-School Correction =====
+# Rule: Within the same school, if there's at least one (FS_1=True & Enrollment_1=False),
+# then any (FS_1=True & Enrollment_1=True) becomes (FS_2=False & Enrollment_2=True).
+# Implementation details:
+# - Compute a school-level boolean flag 'has_fs_only' = any(FS_1=True & Enrollment_1=False) per school.
+# - Initialize FS_2, Enrollment_2 from FS_1, Enrollment_1.
+# - For rows where 'has_fs_only' is True AND row is (FS_1=True & Enrollment_1=True), set FS_2=False.
+# - Recompute Other_2 = NOT(FS_2) AND NOT(Enrollment_2).
+
+def apply_same_school_correction(df_step1_view: pd.DataFrame) -> pd.DataFrame:
+    required = {"school", "document", "FS_1", "Enrollment_1", "Other_1"}
+    missing = required - set(df_step1_view.columns)
+    if missing:
+        raise KeyError(f"[Step 2] Missing required columns: {missing}")
+
+    out = df_step1_view.copy()
+    out["FS_1"] = out["FS_1"].astype(bool)
+    out["Enrollment_1"] = out["Enrollment_1"].astype(bool)
+
+    has_fs_only = (
+        (out["FS_1"] & ~out["Enrollment_1"])
+        .groupby(out["school"])
+        .any()
+        .rename("has_fs_only")
+    )
+
+    out = out.merge(has_fs_only, left_on="school", right_index=True, how="left")
+    out["FS_2"] = out["FS_1"]
+    out["Enrollment_2"] = out["Enrollment_1"]
+
+    to_flip = out["has_fs_only"] & out["FS_1"] & out["Enrollment_1"]
+    out.loc[to_flip, "FS_2"] = False
+
+    out["Other_2"] = (~out["FS_2"]) & (~out["Enrollment_2"])
+    out.drop(columns=["has_fs_only"], inplace=True)
+    return out
+
+
+# ===== Step 3: Short-Document Adjustment (by page count) =====
+# EXACT rules:
+#   A) If (FS_2=True & Enrollment_2=False) and page < 5 → set Other_3=True, FS_3=False (Enrollment_3 unchanged/False).
+#   B) If (FS_2=True & Enrollment_2=True) and page < 5 → set FS_3=False (Enrollment_3 remains True).
+# We always recompute Other_3 = NOT(FS_3) AND NOT(Enrollment_3).
+
+def get_pdf_pages_safe(pdf_path: str) -> int:
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return 0
+
+def apply_short_doc_adjustment(df_step2_view: pd.DataFrame, page_threshold: int = PAGE_THRESHOLD) -> pd.DataFrame:
+    required = {"document", "FS_2", "Enrollment_2", "Other_2"}
+    missing = required - set(df_step2_view.columns)
+    if missing:
+        raise KeyError(f"[Step 3] Missing required columns: {missing}")
+
+    out = df_step2_view.copy()
+    if "page" in out.columns:
+        # Page count collected in Step 1 (scan_document): no need to open the PDFs again
+        out["page"] = out["page"].fillna(0).astype(int)
+    else:
+        out["page"] = out["document"].apply(get_pdf_pages_safe).astype(int)
+
+    out["FS_3"] = out["FS_2"].astype(bool)
+    out["Enrollment_3"] = out["Enrollment_2"].astype(bool)
+    out["Other_3"] = out["Other_2"].astype(bool)
+
+    short_mask = out["page"] < int(page_threshold)
+
+    # Rule A
+    mask_A = short_mask & out["FS_2"] & (~out["Enrollment_2"])
+    out.loc[mask_A, "FS_3"] = False
+    # Enrollment_3 stays as False; ensure Other_3 becomes True
+    out.loc[mask_A, "Other_3"] = True
+
+    # Rule B
+    mask_B = short_mask & out["FS_2"] & out["Enrollment_2"]
+    out.loc[mask_B, "FS_3"] = False
+    # Enrollment_3 stays True
+
+    # Final recomputation for consistency
+    out["Other_3"] = (~out["FS_3"]) & (~out["Enrollment_3"])
+    return out
@@ -0,0 +1,290 @@
+"""
+Step 1 flags for PDFs that are still on the server: the page count and the first / last pages' text are
+read through HTTP Range requests, so a 30 MB ACFR costs its xref, page tree and a few content streams.
+
+pdfminer (under pdfplumber) reads a PDF by seeking: trailer and cross-reference table at the end, then
+only the objects it is asked for. HTTPRangeFile serves those reads from 64 KB blocks fetched on demand.
+Linearization is not needed. A document is downloaded in full instead when the server ignores Range,
+when the reads pass `max_fraction` of the file (a damaged xref makes pdfminer scan everything), or when
+it has no text layer and needs OCR.
+"""
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+import pdfplumber
+import requests
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import LITERAL_PAGES, PDFPage
+from pdfminer.pdftypes import dict_value, int_value, list_value
+from pdfplumber.page import Page
+from tqdm import tqdm
+
+import pdf_flagger
+from pdf_downloader import DOWNLOAD_WORKERS, HTTP, TIMEOUT, download_via_requests, make_session, slugify, target_path
+from pdf_flagger import (KEYWORD_HITS_COLUMN, KEYWORD_MATCHER, META_COLUMNS, NUM_FIRST_PAGES, NUM_LAST_PAGES,
+                         classify_flags, first_and_last_pages, scan_document)
+
+BLOCK_SIZE = 1 << 16       # bytes per Range request block (pdfminer reads 4 KB at a time)
+MAX_FRACTION = 0.5         # above this share of the file read through Range, download it whole instead
+MIN_BUDGET = 4 * BLOCK_SIZE  # small files may always be read this far through Range
+
+# Probe modes
+RANGE, FULL = "range", "full"
+
+
+class RangeNotSupported(Exception):
+    """The server answered a Range request with the whole body (or not with a PDF)."""
+
+
+class ProbeBudgetExceeded(Exception):
+    """The ranged reads of one document went past its byte budget."""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file over an HTTP URL, fetched in `block_size` blocks with Range requests.
+    Blocks are kept once fetched; `bytes_fetched` / `requests` count the traffic.
+    """
+
+    def __init__(self, session: requests.Session, url: str, block_size: int = BLOCK_SIZE,
+                 max_bytes: Optional[int] = None, max_fraction: Optional[float] = MAX_FRACTION):
+        super().__init__()
+        self.session, self.url, self.block_size = session, url, block_size
+        self.blocks: Dict[int, bytes] = {}
+        self.pos = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+        self.error: Optional[Exception] = None   # why reading stopped (pdfplumber re-wraps it)
+        # The first block also tells the size, the validator and whether Range is honoured
+        r = self._get(0, block_size - 1)
+        self.size = int(r.headers["Content-Range"].rsplit("/", 1)[1])
+        self.validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+        self._store(0, r.content)
+        self.max_bytes = max_bytes if max_bytes is not None else (
+            max(int(self.size * max_fraction), MIN_BUDGET) if max_fraction is not None else None)
+
+    def _get(self, first: int, last: int) -> requests.Response:
+        # Byte ranges of a compressed response would be offsets in the compressed body
+        headers = {"Range": f"bytes={first}-{last}", "Accept-Encoding": "identity"}
+        if getattr(self, "validator", None):
+            headers["If-Range"] = self.validator
+        r = self.session.get(self.url, headers=headers, timeout=TIMEOUT, stream=True)
+        self.requests += 1
+        if r.status_code != 206 or "Content-Range" not in r.headers or "text/html" in r.headers.get("Content-Type", ""):
+            r.close()   # without reading a body that may be the whole file
+            r.raise_for_status()
+            raise RangeNotSupported(f"HTTP {r.status_code}, {r.headers.get('Content-Type')} without a byte range")
+        self.bytes_fetched += len(r.content)
+        return r
+
+    def _store(self, first: int, data: bytes) -> None:
+        for i in range(0, len(data), self.block_size):
+            self.blocks[(first + i) // self.block_size] = data[i:i + self.block_size]
+
+    def _fetch(self, first_block: int, last_block: int) -> None:
+        """Fetches the missing blocks of [first_block, last_block], one request per contiguous run."""
+        missing = [b for b in range(first_block, last_block + 1) if b not in self.blocks]
+        while missing:
+            run_end = 0
+            while run_end + 1 < len(missing) and missing[run_end + 1] == missing[run_end] + 1:
+                run_end += 1
+            first = missing[0] * self.block_size
+            last = min((missing[run_end] + 1) * self.block_size, self.size) - 1
+            if self.max_bytes is not None and self.bytes_fetched + last + 1 - first > self.max_bytes:
+                self.error = ProbeBudgetExceeded(f"{self.bytes_fetched} of {self.size} bytes read")
+                raise self.error
+            try:
+                self._store(first, self._get(first, last).content)
+            except (RangeNotSupported, requests.RequestException) as e:
+                self.error = e
+                raise
+            missing = missing[run_end + 1:]
+
+    def save(self, dest: Path) -> None:
+        """Fetches the blocks not read yet (past any budget) and writes the whole file to `dest`."""
+        self.max_bytes = None
+        self._fetch(0, (self.size - 1) // self.block_size)
+        part = Path(f"{dest}.part")
+        with open(part, "wb") as out:
+            for i in range((self.size - 1) // self.block_size + 1):
+                out.write(self.blocks[i])
+        os.replace(part, dest)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(base + offset, 0)
+        return self.pos
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self.size - self.pos)
+        if n <= 0:
+            return 0
+        first_block, last_block = self.pos // self.block_size, (self.pos + n - 1) // self.block_size
+        self._fetch(first_block, last_block)
+        data = b"".join(self.blocks[i] for i in range(first_block, last_block + 1))
+        start = self.pos - first_block * self.block_size
+        b[:n] = data[start:start + n]
+        self.pos += n
+        return n
+
+
+def _page_at(doc: PDFDocument, index: int) -> PDFPage:
+    """
+    Page `index` of the document, found by descending the page tree with the nodes' /Count: only the
+    nodes on its path are read, where PDFPage.create_pages (and so pdfplumber's `pages`) reads every page.
+    """
+    node = dict_value(doc.catalog["Pages"])
+    inherited = {k: v for k, v in doc.catalog.items() if k in PDFPage.INHERITABLE_ATTRS}
+    while True:
+        for k, v in inherited.items():
+            node.setdefault(k, v)
+        inherited = {k: v for k, v in node.items() if k in PDFPage.INHERITABLE_ATTRS}
+        kids = list_value(node["Kids"])
+        if len(kids) == int_value(node.get("Count", -1)):
+            kid = kids[index]   # as many kids as pages below: all of them are leaves
+        else:
+            for kid in kids:
+                count = dict_value(kid).get("Count")
+                count = int_value(count) if count is not None else 1
+                if index < count:
+                    break
+                index -= count
+            else:
+                raise IndexError("page index out of the page tree")
+        props = dict_value(kid).copy()
+        if props.get("Type") is LITERAL_PAGES or "Kids" in props:
+            node = props
+            continue
+        for k, v in inherited.items():
+            props.setdefault(k, v)
+        return PDFPage(doc, kid.objid, props, None)
+
+
+def _range_scan(f: HTTPRangeFile, first_n: int, last_m: int) -> Dict:
+    """scan_document's text and metadata (without OCR and hash), from a ranged file."""
+    # Not closed: pdfplumber's close() would walk every page; the ranged file is closed by the caller
+    pdf = pdfplumber.open(f)
+    try:
+        total = int_value(dict_value(pdf.doc.catalog["Pages"])["Count"])
+        pages = {i: Page(pdf, _page_at(pdf.doc, i), page_number=i + 1) for i in first_and_last_pages(total, first_n, last_m)}
+    except Exception:
+        if f.error is not None:
+            raise
+        # Page tree without usable /Count: fall back to the full walk
+        total = len(pdf.pages)
+        pages = {i: pdf.pages[i] for i in first_and_last_pages(total, first_n, last_m)}
+    texts = {}
+    for i, page in pages.items():
+        try:
+            texts[i] = (page.extract_text() or "").strip()
+        except Exception:
+            if f.error is not None:
+                raise
+    page_texts = [(i, t) for i, t in texts.items() if t]
+    text = "\n".join(t for _, t in page_texts)
+    return {
+        "text": text,
+        "page_texts": page_texts,
+        "page": total,
+        "has_text_layer": bool(text.strip()),
+        "page_text_lengths": {i: len(t) for i, t in texts.items()},
+        "bytes": f.size,
+        "sha256": None,
+    }
+
+
+def probe_document(url: str, session: Optional[requests.Session] = None, first_n: int = NUM_FIRST_PAGES,
+                   last_m: int = NUM_LAST_PAGES, max_fraction: float = MAX_FRACTION,
+                   keep_dir: Optional[Path] = None) -> Dict:
+    """
+    scan_document for a PDF URL: the first / last pages' text and the page count, read through Range
+    requests when possible. Adds `bytes_fetched` and `mode` (RANGE, or FULL when the whole file was needed:
+    the rest of it is then fetched through Range too, or downloaded when the server ignores Range).
+    Full downloads go to `keep_dir` (kept, e.g. the school folder) or to a temporary file (deleted).
+    """
+    session = session or make_session(pool_size=1)
+    f = None
+    try:
+        f = HTTPRangeFile(session, url, max_fraction=max_fraction)
+        scan = _range_scan(f, first_n, last_m)
+        scan["bytes_fetched"], scan["mode"] = f.bytes_fetched, RANGE
+        if scan["has_text_layer"] or not (pdf_flagger._OCR_AVAILABLE and pdf_flagger.ENABLE_OCR):
+            return scan
+        reason = "no text layer, OCR needs the file"
+    except Exception as e:
+        error = f.error if f is not None else e
+        if not isinstance(error, (RangeNotSupported, ProbeBudgetExceeded)):
+            raise
+        reason = str(error)
+    logging.info(f"Full download: {url}: {reason}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = Path(keep_dir or tmp) / (slugify(os.path.basename(url)) or "document.pdf")
+        if f is not None and not isinstance(f.error, RangeNotSupported):
+            f.save(dest)    # only the blocks not read yet are fetched
+            fetched = f.bytes_fetched
+        else:
+            status, size, error = download_via_requests(session, url, dest)
+            if status != HTTP:
+                raise RuntimeError(f"download failed ({status}): {error}")
+            fetched = (f.bytes_fetched if f is not None else 0) + size
+        scan = scan_document(str(dest), first_n, last_m)
+    scan["bytes_fetched"], scan["mode"] = fetched, FULL
+    return scan
+
+
+def probe_flags(df: pd.DataFrame, root_dir: Path = Path("university_pdfs"), workers: int = DOWNLOAD_WORKERS,
+                first_n: int = NUM_FIRST_PAGES, last_m: int = NUM_LAST_PAGES, max_fraction: float = MAX_FRACTION,
+                session: Optional[requests.Session] = None) -> pd.DataFrame:
+    """
+    build_flag_df for the rows of a disclosure list (CREDIT, document_name, pdf_url), without downloading them.
+
+    `school` and `document` are what the downloaded file would be (<root_dir>/<CREDIT>/<name>.pdf), so the
+    frame goes through Steps 2 and 3 (apply_same_school_correction, apply_short_doc_adjustment) unchanged.
+    Extra columns: pdf_url, bytes_fetched, mode. Documents that could not be probed are left out.
+    """
+    rows = df.dropna(subset=["CREDIT", "pdf_url", "document_name"]).drop_duplicates("pdf_url")
+    session = session or make_session(pool_size=workers)
+
+    def probe(row) -> Optional[Dict]:
+        path = target_path(root_dir, row.CREDIT, row.document_name, row.pdf_url)
+        try:
+            scan = probe_document(row.pdf_url, session, first_n, last_m, max_fraction)
+        except Exception as e:
+            logging.warning(f"Jump: {row.pdf_url}: {e}")
+            return None
+        return {
+            "school": slugify(row.CREDIT),
+            "document": str(path),
+            **classify_flags(scan["text"]),
+            **{c: scan[c] for c in META_COLUMNS},
+            KEYWORD_HITS_COLUMN: KEYWORD_MATCHER.page_counts(scan["page_texts"]),
+            "pdf_url": row.pdf_url,
+            "bytes_fetched": scan["bytes_fetched"],
+            "mode": scan["mode"],
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = list(tqdm(pool.map(probe, rows.itertuples(index=False)), total=len(rows), desc="Probing PDFs"))
+    out = pd.DataFrame([r for r in records if r is not None],
+                       columns=["school", "document", "FS", "Enrollment", "Other"] + META_COLUMNS
+                       + [KEYWORD_HITS_COLUMN, "pdf_url", "bytes_fetched", "mode"])
+    if len(out):
+        print(f"Probed {len(out)} of {len(rows)} PDFs: {out['bytes_fetched'].sum() / 2**20:.1f} MB read "
+              f"for {out['bytes'].sum() / 2**20:.1f} MB of documents ({(out['mode'] == FULL).sum()} downloaded in full)")
+    return out
@@ -0,0 +1,262 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx   # transport of the LlamaCloud client
+except ImportError:
+    httpx = None
+
+INITIAL_RATE = 4.0         # requests per second a host starts at
+MIN_RATE = 0.2             # floor the rate is never cut below
+MAX_RATE = 50.0            # ceiling the additive increase stops at
+BURST = 8                  # tokens a bucket holds (requests that may go out back to back)
+INCREASE = 1.0             # requests/s added per `rate` successes, i.e. about once a second (additive increase)
+DECREASE = 0.5             # factor the rate is multiplied by on a throttling answer (multiplicative decrease)
+RETRIES = 4                # extra attempts after the first one
+BASE_DELAY = 1.0           # seconds; backoff before retry n is uniform(0, min(MAX_DELAY, BASE_DELAY * 2**n))
+MAX_DELAY = 60.0
+
+# Answers that mean "slow down". 403 is EMMA's (and most WAFs') way to refuse a client that goes too
+# fast, but it also answers pages that need the browser, so it lowers the rate without being retried.
+THROTTLE_STATUSES = frozenset({403, 429, 500, 502, 503, 504})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Errors without a status that are worth retrying: the remote could not be reached or did not answer in time
+RETRY_ERRORS = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout) + (
+    (httpx.TransportError,) if httpx is not None else ())
+# ... and API client errors of that kind, by class name (the client libraries are optional)
+RETRY_ERROR_NAMES = frozenset({"RateLimitError", "APIConnectionError", "APITimeoutError"})
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc or url
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP date), None if absent or unreadable."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status behind an exception: `status_code` of API client errors, or of their `response`."""
+    for obj in (error, getattr(error, "response", None)):
+        status = getattr(obj, "status_code", None) or getattr(obj, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in THROTTLE_STATUSES
+    text = str(error).lower()
+    return "rate limit" in text or "too many requests" in text
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the remote (AIMD): each second of successes adds
+    `increase` requests/s (increase / rate per success, as TCP grows its window), every throttling
+    answer multiplies the rate by `decrease` and, if the answer carried a Retry-After, holds every
+    caller until then. Thread-safe; `acquire` blocks until a token is free.
+    """
+
+    def __init__(self, rate: float = INITIAL_RATE, burst: int = BURST, min_rate: float = MIN_RATE,
+                 max_rate: float = MAX_RATE, increase: float = INCREASE, decrease: float = DECREASE):
+        self.rate, self.burst = rate, burst
+        self.min_rate, self.max_rate = min_rate, max_rate
+        self.increase, self.decrease = increase, decrease
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class HostRateLimiter:
+    """One AdaptiveRateLimiter per host (or any key), created on first use with the same settings."""
+
+    def __init__(self, **limiter_kwargs):
+        self.limiter_kwargs = limiter_kwargs
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_key(self, key: str) -> AdaptiveRateLimiter:
+        with self._lock:
+            limiter = self.limiters.get(key)
+            if limiter is None:
+                limiter = self.limiters[key] = AdaptiveRateLimiter(**self.limiter_kwargs)
+            return limiter
+
+    def for_url(self, url: str) -> AdaptiveRateLimiter:
+        return self.for_key(host_of(url))
+
+    def report(self) -> pd.DataFrame:
+        """Current rate and throttling answers per host."""
+        return pd.DataFrame([{"host": k, "rate": round(v.rate, 2), "throttled": v.throttled}
+                             for k, v in self.limiters.items()], columns=["host", "rate", "throttled"])
+
+
+class DeadLetters:
+    """Calls that still failed after every retry, kept so they can be written to a CSV and re-run."""
+
+    COLUMNS = ["key", "error", "attempts", "throttled", "time"]
+
+    def __init__(self):
+        self.entries: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, key: str, error: BaseException, attempts: int) -> None:
+        with self._lock:
+            self.entries.append({"key": key, "error": str(error), "attempts": attempts,
+                                 "throttled": is_throttle_error(error), "time": time.time()})
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.entries, columns=self.COLUMNS)
+
+    def save(self, path: str) -> None:
+        """Writes the dead letters to `path` (nothing is written when there are none)."""
+        if self.entries:
+            self.frame().to_csv(path, index=False)
+            print(f"Logged {len(self.entries)} calls that failed after retries to {path}")
+
+
+class RetryScheduler:
+    """
+    Runs calls through a rate limiter with jittered exponential backoff ("full jitter": retry n waits
+    uniform(0, min(max_delay, base_delay * 2**n)) seconds, or the remote's Retry-After when longer).
+
+    Throttling errors slow the limiter down, successes speed it up. Errors that are not worth retrying
+    (`retryable` returns False; by default all but RETRY_STATUSES, RETRY_ERRORS and rate-limit errors,
+    so e.g. a 4xx other than 429 or a bug in the called code) fail at once. A call that still fails
+    after `retries` extra attempts is recorded in `dead_letters` and its last error is raised.
+    """
+
+    def __init__(self, limiter: Optional[AdaptiveRateLimiter] = None, retries: int = RETRIES,
+                 base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+                 retryable: Optional[Callable[[BaseException], bool]] = None):
+        self.limiter = limiter
+        self.retries = retries
+        self.base_delay, self.max_delay = base_delay, max_delay
+        self.retryable = retryable or self._default_retryable
+        self.dead_letters = DeadLetters()
+
+    @staticmethod
+    def _default_retryable(error: BaseException) -> bool:
+        status = error_status(error)
+        if status is not None:
+            return status in RETRY_STATUSES
+        if isinstance(error, RETRY_ERRORS):
+            return True
+        return is_throttle_error(error) or any(cls.__name__ in RETRY_ERROR_NAMES for cls in type(error).__mro__)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                retry_after = retry_after_seconds(
+                    getattr(getattr(e, "response", None), "headers", {}).get("Retry-After"))
+                if self.limiter is not None and throttled:
+                    self.limiter.on_throttle(retry_after)
+                if attempt == self.retries or not self.retryable(e):
+                    self.dead_letters.add(key, e, attempt + 1)
+                    raise
+                delay = max(self.backoff(attempt), retry_after or 0.0)
+                print(f"[retry {attempt + 1}/{self.retries}] {key}: {e}; waiting {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                if self.limiter is not None:
+                    self.limiter.on_success()
+                return result
+
+    def wrap(self, fn: Callable[[str], Any]) -> Callable[[str], Any]:
+        """`fn(path)` run through `call`, keyed by its path argument (e.g. `agent.extract`)."""
+        def scheduled(path: str, *args, **kwargs):
+            return self.call(str(path), fn, path, *args, **kwargs)
+        return scheduled
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    requests adapter that sends every request through the limiter of its host and retries
+    RETRY_STATUSES answers itself (jittered backoff, Retry-After honoured), so that each of them also
+    lowers the host's rate. Mounted by pdf_downloader.make_session when it is given a HostRateLimiter.
+    """
+
+    def __init__(self, limiters: HostRateLimiter, retries: int = RETRIES, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, **kwargs):
+        super().__init__(**kwargs)
+        self.limiters = limiters
+        self.status_retries = retries
+        self.base_delay, self.max_delay = base_delay, max_delay
+
+    def send(self, request, **kwargs):
+        limiter = self.limiters.for_url(request.url)
+        for attempt in range(self.status_retries + 1):
+            limiter.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code not in THROTTLE_STATUSES:
+                limiter.on_success()
+                return response
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+            limiter.on_throttle(retry_after)
+            if response.status_code not in RETRY_STATUSES or attempt == self.status_retries:
+                return response
+            response.close()
+            time.sleep(max(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)), retry_after or 0.0))
+        return response
@@ -0,0 +1,245 @@
+"""
+Long-format store of extraction results: one row per (school, fiscal year, statement, metric, run) in a
+Parquet file, with the extracted value, the model's reasoning and the document the value came from.
+
+The notebooks used to write one Excel sheet per school (sheet names cut to school[:31], so long names
+that share a prefix overwrote each other) and read the workbook back with sheet_name=None only to
+transpose it into all_schools_combined.xlsx. Here the rows are built from the outcomes directly, the
+combined tables are in-memory pivots of them, and Excel is only written as a final export:
+
+    store = ResultStore("output_cash_flow/results.parquet")
+    rows = outcome_rows(by_school, "cash_flows", 2024, transform=scale_cash_flow_data)
+    store.write(rows, "cash_flows", 2024)
+    df_comb = pivot(store.read("cash_flows", 2024))
+    export_excel(df_comb, "output_cash_flow/all_update_combined.xlsx")
+
+Values are kept in two columns, as Parquet needs one type per column: `value` (float) for numbers and
+`value_text` for everything else (text as is, lists and dicts as JSON, like run_journal._parquet_safe).
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from extraction_engine import ExtractionOutcome, run_data
+
+RESULT_PATH = "results.parquet"   # default store location, relative to the working directory
+RUN_ID = "1"                      # run id of results written without one
+
+COLUMNS = ["school", "fiscal_year", "statement", "metric", "value", "value_text", "reasoning",
+           "source_document", "run_id"]
+KEYS = ["school", "fiscal_year", "statement", "metric", "run_id"]
+
+SCHEMA = pa.schema([
+    ("school", pa.string()),
+    ("fiscal_year", pa.int64()),
+    ("statement", pa.string()),
+    ("metric", pa.string()),
+    ("value", pa.float64()),
+    ("value_text", pa.string()),
+    ("reasoning", pa.string()),
+    ("source_document", pa.string()),
+    ("run_id", pa.string()),
+])
+
+EXCEL_SHEET_CHARS = 31   # Excel's limit on sheet names
+
+
+def _split_value(v: Any):
+    """(value, value_text) of one extracted value."""
+    if v is None or isinstance(v, bool):
+        return None, (None if v is None else json.dumps(v))
+    if isinstance(v, (int, float)):
+        return float(v), None
+    if isinstance(v, str):
+        return None, v
+    return None, json.dumps(v, default=str)
+
+
+def _reasoning(outcome: ExtractionOutcome) -> Dict[str, Any]:
+    """metric -> reasoning from the run's extraction metadata (empty if it has none)."""
+    meta = getattr(outcome.run, "extraction_metadata", None) or {}
+    fields = meta.get("field_metadata", {}) if isinstance(meta, dict) else {}
+    return {k: v.get("reasoning") for k, v in fields.items() if isinstance(v, dict)}
+
+
+def school_rows(school: str,
+                outcomes: List[ExtractionOutcome],
+                statement: str,
+                fiscal_year: int,
+                run_id: str = RUN_ID,
+                transform: Optional[Callable[[dict], dict]] = None) -> List[dict]:
+    """
+    Rows of one school, its files merged as extraction_engine.merge_data does (keys from the first
+    successful extraction, last non-empty value wins); each row keeps the file its value came from and
+    that run's reasoning. `transform` gets a copy of each run's data.
+    """
+    merged: Dict[str, Any] = {}
+    sources: Dict[str, ExtractionOutcome] = {}
+    first_keys = None
+    for outcome in outcomes:
+        data = run_data(outcome)
+        if data is None:
+            continue
+        if transform is not None:
+            data = transform(dict(data))
+        if first_keys is None:
+            first_keys = list(data.keys())
+            merged = {k: None for k in first_keys}
+        for k, v in data.items():
+            if v not in (None, "", []):
+                merged[k] = v
+                sources[k] = outcome
+    rows = []
+    for metric, v in merged.items():
+        value, value_text = _split_value(v)
+        source = sources.get(metric)
+        reasoning = _reasoning(source).get(metric) if source is not None else None
+        rows.append({"school": school, "fiscal_year": fiscal_year, "statement": statement, "metric": metric,
+                     "value": value, "value_text": value_text,
+                     "reasoning": None if reasoning is None else str(reasoning),
+                     "source_document": source.fname if source is not None else None, "run_id": run_id})
+    return rows
+
+
+def outcome_rows(by_school: Dict[str, List[ExtractionOutcome]],
+                 statement: str,
+                 fiscal_year: int,
+                 run_id: str = RUN_ID,
+                 transform: Optional[Callable[[dict], dict]] = None) -> pd.DataFrame:
+    """Result rows of every school of an (extract_schools / journal-rebuilt) run. Schools with no data are left out."""
+    rows = []
+    for school, outcomes in by_school.items():
+        school_result = school_rows(school, outcomes, statement, fiscal_year, run_id, transform)
+        if not school_result:
+            print(f"No data for {school}.")
+        rows.extend(school_result)
+    return as_rows(pd.DataFrame(rows, columns=COLUMNS))
+
+
+def as_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """`df` with the store's columns and types."""
+    return pa.Table.from_pandas(df.reindex(columns=COLUMNS), schema=SCHEMA, preserve_index=False).to_pandas()
+
+
+class ResultStore:
+    """
+    Result rows in one Parquet file. Writing a run's rows replaces everything stored for its (statement,
+    fiscal year, run id), schools that have no data this time included, and keeps the rest, so
+    statements and runs accumulate in one place.
+
+        store = ResultStore("output_cash_flow/results.parquet")
+        store.write(outcome_rows(by_school, "cash_flows", 2024), "cash_flows", 2024)
+        df_comb = pivot(store.read("cash_flows", 2024))
+    """
+
+    def __init__(self, path: str = RESULT_PATH):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def read(self, statement: Optional[str] = None, fiscal_year: Optional[int] = None,
+             run_id: Optional[str] = None) -> pd.DataFrame:
+        """Stored rows, optionally only those of one statement / fiscal year / run."""
+        if not os.path.exists(self.path):
+            return as_rows(pd.DataFrame(columns=COLUMNS))
+        filters = [(c, "==", v) for c, v in (("statement", statement), ("fiscal_year", fiscal_year),
+                                             ("run_id", run_id)) if v is not None]
+        return pd.read_parquet(self.path, filters=filters or None)
+
+    def write(self, rows: pd.DataFrame, statement: Optional[str] = None, fiscal_year: Optional[int] = None,
+              run_id: str = RUN_ID) -> int:
+        """
+        Stores `rows` (see outcome_rows) in place of all stored rows of their (statement, fiscal year, run
+        id) batches, and of the batch given by `statement` / `fiscal_year` / `run_id` (which `rows` may
+        leave empty, e.g. when no school had data). Returns the number of stored rows.
+        """
+        rows = as_rows(rows)
+        batch = ["statement", "fiscal_year", "run_id"]
+        batches = rows[batch].drop_duplicates()
+        if statement is not None and fiscal_year is not None:
+            batches = pd.concat([batches, as_rows(pd.DataFrame([{"statement": statement, "fiscal_year": fiscal_year,
+                                                                 "run_id": run_id}]))[batch]])
+        stored = self.read()
+        if not stored.empty and not batches.empty:
+            replaced = pd.MultiIndex.from_frame(stored[batch]).isin(pd.MultiIndex.from_frame(batches))
+            stored = stored[~replaced]
+        table = as_rows(pd.concat([stored, rows], ignore_index=True)) if not stored.empty else rows
+        tmp = f"{self.path}.tmp"
+        table.to_parquet(tmp, index=False, schema=SCHEMA)
+        os.replace(tmp, self.path)
+        print(f"{len(rows)} result rows written to {self.path} ({len(table)} stored)")
+        return len(table)
+
+
+def pivot(rows: pd.DataFrame, with_reasoning: bool = False) -> pd.DataFrame:
+    """
+    One row per school (index "School", sorted), one column per metric in extraction order: the table the
+    notebooks combined from the per-school sheets. Pass the rows of one statement, fiscal year and run
+    (if several carry the same school and metric, the last one wins). With `with_reasoning`, the
+    values and the reasoning side by side under "values" / "reasoning" column groups.
+    """
+    rows = rows.drop_duplicates(["school", "metric"], keep="last")
+    metrics = pd.unique(rows["metric"])
+    cells = rows["value"].astype(object).where(rows["value"].notna(), rows["value_text"])
+    values = (rows.assign(cell=cells).pivot(index="school", columns="metric", values="cell")
+              .reindex(columns=metrics).infer_objects())
+    values.index.name = "School"
+    values.columns.name = None
+    if not with_reasoning:
+        return values
+    reasoning = rows.pivot(index="school", columns="metric", values="reasoning").reindex(columns=metrics)
+    reasoning.index.name = "School"
+    reasoning.columns.name = None
+    return pd.concat({"values": values, "reasoning": reasoning}, axis=1)
+
+
+def excel_engine() -> str:
+    """xlsxwriter (much faster for writing) when installed, else openpyxl."""
+    try:
+        import xlsxwriter  # noqa: F401
+        return "xlsxwriter"
+    except ImportError:
+        return "openpyxl"
+
+
+def sheet_names(schools: Iterable[str]) -> Dict[str, str]:
+    """school -> a distinct Excel sheet name: school[:31], with a ~N suffix where two would collide."""
+    names, taken = {}, set()
+    for school in schools:
+        name = school[:EXCEL_SHEET_CHARS]
+        n = 1
+        while name.lower() in taken:
+            n += 1
+            suffix = f"~{n}"
+            name = school[:EXCEL_SHEET_CHARS - len(suffix)] + suffix
+        taken.add(name.lower())
+        names[school] = name
+    return names
+
+
+def export_excel(df: pd.DataFrame, path: str, sheet_name: str = "Combined") -> None:
+    """Writes a (pivoted) table to a one-sheet workbook."""
+    with pd.ExcelWriter(path, engine=excel_engine()) as writer:
+        df.to_excel(writer, sheet_name=sheet_name)
+    print(f"Saved: {path}")
+
+
+def export_school_sheets(rows: pd.DataFrame, path: str, column: str, with_reasoning: bool = False) -> Dict[str, str]:
+    """
+    The per-school workbook the notebooks wrote: one sheet per school, a "Metric" index and the values
+    under `column` (plus a "reasoning" column). Returns school -> sheet name.
+    """
+    names = sheet_names(sorted(rows["school"].unique()))
+    cells = rows["value"].astype(object).where(rows["value"].notna(), rows["value_text"])
+    frames = rows.assign(**{column: cells}).set_index("metric")
+    with pd.ExcelWriter(path, engine=excel_engine()) as writer:
+        for school, df in frames.groupby("school", sort=True):
+            sheet = df[[column, "reasoning"] if with_reasoning else [column]]
+            sheet.index.name = "Metric"
+            sheet.to_excel(writer, sheet_name=names[school])
+    print(f"All schools written to {path}")
+    return names
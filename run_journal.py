@@ -0,0 +1,180 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from extraction_cache import CachedRun, schema_hash
+from extraction_engine import MAX_WORKERS, ExtractionOutcome, extract_jobs, group_by_school, school_jobs
+from result_store import RUN_ID, ResultStore, export_school_sheets, outcome_rows, pivot
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of one batch run: one line per finished (school, file) extraction.
+
+    Lines are flushed to disk as soon as each extraction completes, so a run killed by a kernel
+    restart or an API error burst loses at most the jobs that were in flight. The latest line for a
+    (school, file) wins, which lets a failed file be retried on the next run.
+
+    Every line records the run it belongs to: the schema hash, the statement and the fiscal year.
+    Only the lines of this journal's run count, so after a schema / prompt or fiscal-year change the
+    same file starts over instead of resuming from results extracted for another run.
+
+        journal = RunJournal(os.path.join(OUTPUT_ROOT, "run_journal.jsonl"),
+                             schema=StatementOfCashFlows2024, statement="cash_flows", fiscal_year=2024)
+    """
+
+    def __init__(self, path: str, schema: Any = None, statement: str = "", fiscal_year: Optional[int] = None):
+        self.path = path
+        self.run_key = {
+            "schema_hash": schema_hash(schema) if schema is not None else None,
+            "statement": statement,
+            "fiscal_year": fiscal_year,
+        }
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def _in_run(self, entry: dict) -> bool:
+        # Lines written before run keys were recorded count as the run without schema / statement / year
+        return all(entry.get(k, "" if k == "statement" else None) == v for k, v in self.run_key.items())
+
+    def record(self, outcome: ExtractionOutcome) -> None:
+        """Appends one finished extraction (successful or not)."""
+        entry = {
+            "school": outcome.school,
+            "fname": outcome.fname,
+            "path": outcome.path,
+            "ok": outcome.error is None,
+            "time": time.time(),
+            **self.run_key,
+        }
+        if outcome.error is None:
+            entry["data"] = outcome.run.data
+            entry["extraction_metadata"] = getattr(outcome.run, "extraction_metadata", None)
+        else:
+            entry["error"] = str(outcome.error)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def entries(self) -> List[dict]:
+        """All journal lines in order. A truncated last line (crash mid-write) is ignored."""
+        if not os.path.exists(self.path):
+            return []
+        out = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    continue
+        return out
+
+    def latest(self) -> Dict[tuple, dict]:
+        """(school, fname) -> latest journal entry of this journal's run (see the class docstring)."""
+        return {(e["school"], e["fname"]): e for e in self.entries() if self._in_run(e)}
+
+    def other_runs(self) -> int:
+        """Number of journal lines written for another schema, statement or fiscal year (ignored)."""
+        return sum(not self._in_run(e) for e in self.entries())
+
+    def completed(self) -> set:
+        """(school, fname) pairs whose latest extraction succeeded."""
+        return {key for key, e in self.latest().items() if e["ok"]}
+
+    def outcomes(self) -> List[ExtractionOutcome]:
+        """Latest outcome per (school, file), in sorted school / file order."""
+        out = []
+        for (school, fname), e in sorted(self.latest().items()):
+            if e["ok"]:
+                run = CachedRun(e.get("data"), e.get("extraction_metadata"))
+                out.append(ExtractionOutcome(school, fname, e["path"], run=run))
+            else:
+                out.append(ExtractionOutcome(school, fname, e["path"], error=RuntimeError(e.get("error"))))
+        return out
+
+
+def extract_schools_resumable(extract: Callable[[str], Any],
+                              pdf_root: str,
+                              journal: RunJournal,
+                              max_workers: int = MAX_WORKERS,
+                              select_files: Optional[Callable[[List[str]], List[str]]] = None,
+                              retry_failed: bool = True) -> Dict[str, List[ExtractionOutcome]]:
+    """
+    Same as `extraction_engine.extract_schools`, but journaled and resumable.
+
+    Files already extracted successfully according to `journal` are not sent again. Failed files
+    are retried unless `retry_failed` is False. The returned outcomes are rebuilt from the journal,
+    so they cover the previous (interrupted) runs as well as this one.
+    """
+    jobs = school_jobs(pdf_root, select_files)
+    return group_by_school(pdf_root, extract_jobs_resumable(extract, jobs, journal, max_workers, retry_failed))
+
+
+def extract_jobs_resumable(extract: Callable[[str], Any],
+                           jobs: List[tuple],
+                           journal: RunJournal,
+                           max_workers: int = MAX_WORKERS,
+                           retry_failed: bool = True) -> List[ExtractionOutcome]:
+    """
+    `extraction_engine.extract_jobs` for (school, fname, path) jobs, journaled: jobs the journal has
+    already done are not sent again. Returns the journal's latest outcome of every job.
+    """
+    latest = journal.latest()
+    ignored = journal.other_runs()
+    if ignored:
+        print(f"{ignored} lines of {journal.path} belong to another schema, statement or fiscal year; ignored")
+    todo = [job for job in jobs
+            if (job[0], job[1]) not in latest
+            or (retry_failed and not latest[(job[0], job[1])]["ok"])]
+    print(f"{len(jobs) - len(todo)} of {len(jobs)} files already in {journal.path}; extracting {len(todo)}")
+    extract_jobs(extract, todo, max_workers, on_result=journal.record)
+
+    wanted = {(job[0], job[1]) for job in jobs}
+    return [o for o in journal.outcomes() if (o.school, o.fname) in wanted]
+
+
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet needs one type per column: numeric where possible, otherwise text."""
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == object:
+            numeric = pd.to_numeric(out[col], errors="coerce")
+            if numeric.notna().sum() == out[col].notna().sum():
+                out[col] = numeric
+            else:
+                out[col] = out[col].map(lambda v: v if v is None or isinstance(v, str) else json.dumps(v, default=str))
+    return out
+
+
+def rebuild_outputs(by_school: Dict[str, List[ExtractionOutcome]],
+                    column: str,
+                    excel_path: Optional[str] = None,
+                    parquet_path: Optional[str] = None,
+                    transform: Optional[Callable[[dict], dict]] = None,
+                    store: Optional[ResultStore] = None,
+                    statement: str = "",
+                    fiscal_year: int = 0,
+                    run_id: str = RUN_ID) -> pd.DataFrame:
+    """
+    Writes the final outputs of a run from its (journal-rebuilt) outcomes.
+
+    `store` gets the long-format result rows (result_store.py) under `statement` / `fiscal_year` /
+    `run_id`; `excel_path` gets one sheet per school, as the notebooks write it; `parquet_path` gets
+    the combined table (one row per school, one column per metric). Returns the combined table.
+    """
+    rows = outcome_rows(by_school, statement, fiscal_year, run_id, transform)
+    if store is not None:
+        store.write(rows, statement, fiscal_year, run_id)
+    if excel_path:
+        export_school_sheets(rows, excel_path, column)
+
+    df_comb = pivot(rows)
+    if parquet_path:
+        _parquet_safe(df_comb).to_parquet(parquet_path)
+        print(f"Combined table written to {parquet_path}")
+    return df_comb
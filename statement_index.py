@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import page_selector
+import pdf_flagger
+from extraction_cache import file_sha256
+from page_selector import STATEMENT_KEYWORDS, select_pages
+from pdf_flagger import list_pdfs, parse_school_from_path
+
+# Default location of the index, relative to the notebook's working directory
+INDEX_PATH = ".statement_index.parquet"
+
+KEY_COLUMNS = ["sha256", "school", "document", "page"]
+
+
+def scoring_version() -> str:
+    """Hash of the page scoring rules: an index built with other rules is rebuilt, not reused."""
+    rules = {
+        "keywords": STATEMENT_KEYWORDS,
+        "settings": [page_selector.TITLE_CHARS, page_selector.TITLE_WEIGHT, page_selector.MIN_AMOUNTS],
+    }
+    canonical = json.dumps(rules, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _score_document(pdf_path: str) -> Optional[pd.DataFrame]:
+    try:
+        sha = file_sha256(pdf_path)
+        scores = page_selector.score_pages(pdf_path).reset_index()
+    except Exception as e:
+        logging.warning(f"Jump: {pdf_path}: {e}")
+        return None
+    scores.insert(0, "sha256", sha)
+    scores.insert(1, "school", parse_school_from_path(pdf_path))
+    scores.insert(2, "document", pdf_path)
+    return scores
+
+
+def _init_index_worker(page_text_store) -> None:
+    pdf_flagger.PAGE_TEXT_STORE = page_text_store
+
+
+class StatementIndex:
+    """
+    Persisted (school, document, page) -> statement-type scores for a PDF corpus.
+
+    One row per page, one score column per STATEMENT_KEYWORDS type (page_selector.score_page).
+    Documents are keyed by file hash, so a PDF is scored once however many folders it sits in.
+    Page text comes through pdf_flagger.extract_page_texts, i.e. from the PageTextStore when one is set,
+    so building the index after the flagger has run mostly reads cached text.
+
+    Lookups are by file hash (pass the flagger's `sha256` column to skip hashing) through an in-memory dict.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.version = scoring_version()
+        self.df = pd.DataFrame(columns=KEY_COLUMNS + list(STATEMENT_KEYWORDS))
+        if os.path.exists(path):
+            df = pd.read_parquet(path)
+            if (df["scoring_version"] == self.version).all():
+                self.df = df.drop(columns=["scoring_version"])[self.df.columns]
+            else:
+                logging.info(f"{path} was built with other scoring rules; it will be rebuilt")
+        self._reindex()
+
+    def _reindex(self) -> None:
+        # Copies of a document under other paths carry the same pages: one set of rows per hash
+        pages = self.df.drop_duplicates(["sha256", "page"])
+        self._by_sha: Dict[str, pd.DataFrame] = {
+            sha: g.set_index("page")[list(STATEMENT_KEYWORDS)] for sha, g in pages.groupby("sha256", sort=False)
+        }
+
+    def save(self) -> None:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        out = self.df.assign(scoring_version=self.version)
+        tmp = f"{self.path}.tmp"
+        out.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+
+    def build(self, folder_path: str, workers: int = 1, chunksize: int = 4) -> pd.DataFrame:
+        """
+        Scores every PDF under `folder_path` that is not indexed yet (by hash), then saves the index.
+        Documents already indexed under another path are recorded under the new path too, without rescoring.
+        Returns the rows of this folder.
+        """
+        paths = list_pdfs(folder_path)
+        indexed = set(zip(self.df["document"], self.df["sha256"]))
+        todo, aliases = [], []
+        for path in paths:
+            sha = file_sha256(path)
+            if (path, sha) in indexed:
+                continue
+            if sha in self._by_sha:
+                aliases.append((path, sha))
+            else:
+                todo.append(path)
+        logging.info(f"Statement index: {len(paths) - len(todo)} of {len(paths)} documents already scored; scoring {len(todo)}")
+
+        if workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_index_worker,
+                                     initargs=(pdf_flagger.PAGE_TEXT_STORE,)) as pool:
+                frames = list(pool.map(_score_document, todo, chunksize=chunksize))
+        else:
+            frames = [_score_document(p) for p in todo]
+        for path, sha in aliases:
+            frame = self._by_sha[sha].reset_index()
+            frame.insert(0, "sha256", sha)
+            frame.insert(1, "school", parse_school_from_path(path))
+            frame.insert(2, "document", path)
+            frames.append(frame)
+
+        frames = [f for f in frames if f is not None]
+        if frames:
+            # A path whose file changed since it was indexed only keeps its new rows
+            replaced = self.df["document"].isin([f["document"].iloc[0] for f in frames])
+            self.df = pd.concat([self.df[~replaced]] + frames, ignore_index=True)[KEY_COLUMNS + list(STATEMENT_KEYWORDS)]
+            self._reindex()
+            self.save()
+        return self.df[self.df["document"].isin(paths)]
+
+    def scores(self, pdf_path: Optional[str] = None, sha256: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Page x statement scores of one PDF (by hash, computed from `pdf_path` if not given), or None if not indexed."""
+        if sha256 is None:
+            sha256 = file_sha256(pdf_path)
+        return self._by_sha.get(sha256)
+
+    def best_pages(self, pdf_path: str, statement: str, top_k: int = page_selector.TOP_K,
+                   neighbours: int = page_selector.NEIGHBOURS) -> Optional[List[int]]:
+        """page_selector.select_pages for one indexed PDF, or None if it is not indexed."""
+        scores = self.scores(pdf_path)
+        return None if scores is None else select_pages(scores[statement], top_k, neighbours)
+
+    def locate(self, statement: str, school: Optional[str] = None) -> pd.DataFrame:
+        """Best-scoring page of every indexed document (of one school), best documents first."""
+        df = self.df if school is None else self.df[self.df["school"] == school]
+        if df.empty:
+            return pd.DataFrame(columns=["school", "document", "page", "score"])
+        best = df.loc[df.groupby("document", sort=False)[statement].idxmax()]
+        out = best[["school", "document", "page", statement]].rename(columns={statement: "score"})
+        return out.sort_values(["school", "score"], ascending=[True, False], kind="mergesort").reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self._by_sha)
+
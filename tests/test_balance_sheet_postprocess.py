@@ -0,0 +1,130 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from balance_sheet_postprocess import (ASSET_COMPONENTS, LIABILITY_COMPONENTS, NET_RECEIVABLES_COMPONENTS,
+                                       PAIRS_TO_RECONCILE, add_plug_accounts)
+
+
+def add_plug_accounts_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    """The notebook's row-by-row add_plug_accounts (reference for the golden comparison)."""
+    for new_col, cols_to_sum in PAIRS_TO_RECONCILE.items():
+        col1, col2 = cols_to_sum
+        df[new_col] = df.apply(
+            lambda row: (
+                row[col1] if pd.isna(row[col2]) else
+                row[col2] if pd.isna(row[col1]) else
+                row[col1] if row[col1] == row[col2] else
+                row[col2]
+            ),
+            axis=1
+        )
+
+    df["receivables_leftover_calculated"] = df["all_receivables"] - df[NET_RECEIVABLES_COMPONENTS].fillna(0).sum(axis=1)
+    df["net_receivables"] = df[NET_RECEIVABLES_COMPONENTS].fillna(0).sum(axis=1) + df["receivables_leftover_calculated"]
+
+    df["pension_and_opeb_liability"] = df.get("pension_liability", 0).fillna(0) + df.get("opeb_liability", 0).fillna(0)
+
+    df["accumulated_depreciation"] = (
+        np.where(
+            df["accumulated_depreciation_bs"].fillna(0)
+            == df["accumulated_depreciation_notes"].fillna(0),
+            df["accumulated_depreciation_bs"].fillna(0),
+            df["accumulated_depreciation_bs"].fillna(0)
+            + df["accumulated_depreciation_notes"].fillna(0),
+        )
+        +
+        np.where(
+            df["accumulated_amortization_bs"].fillna(0)
+            == df["accumulated_amortization_notes"].fillna(0),
+            df["accumulated_amortization_bs"].fillna(0),
+            df["accumulated_amortization_bs"].fillna(0)
+            + df["accumulated_amortization_notes"].fillna(0),
+        )
+    )
+    df["long_term_investments_unrestricted_and_restricted"] = (
+        df.get("long_term_investments", 0).fillna(0)
+        + df.get("cash_surrender_value_life_insurance", 0).fillna(0)
+    )
+
+    a = df.get("deferred_revenue_raw", 0).fillna(0)
+    b = df.get("student_tuition_and_deposits", 0).fillna(0)
+    c = df.get("student_credit_balances_and_deposits", 0).fillna(0)
+    df["deferred_revenue"] = (
+        pd.DataFrame({"a": a, "b": b, "c": c})
+        .apply(lambda x: sum(set(x[x != 0])), axis=1)
+    )
+    df["deferred_revenue"] -= df.get("asset_retirement_obligations", 0).fillna(0) * df.get("asset_retirement_obligations", 0).fillna(0)
+    df["all_deferred_revenue"] -= df.get("asset_retirement_obligations", 0).fillna(0) * df.get("asset_retirement_obligations", 0).fillna(0)
+
+    df["long_term_debt"] = (
+        df.get("long_term_debt_labeled", 0).fillna(0)
+        + df.get("other_long_term_debt_obligations", 0).fillna(0)
+        + df.get("finance_lease_liability", 0).fillna(0)
+    )
+    df["long_term_debt"] = df["long_term_debt"].where(
+        df["long_term_debt"] != 0,
+        df.get("backup_total_long_term_debt", 0).fillna(0)
+    )
+
+    df["net_fixed_assets"] = df["net_fixed_assets_raw"].fillna(0) + df["rou_assets_finance_lease"].fillna(0)
+
+    assets_cols = [c for c in ASSET_COMPONENTS if c in df.columns]
+    liabs_cols = [c for c in LIABILITY_COMPONENTS if c in df.columns]
+    df["sum_asset_components"] = df[assets_cols].sum(axis=1, skipna=True)
+    df["sum_liability_components"] = df[liabs_cols].sum(axis=1, skipna=True)
+    df["other_assets_plug"] = df["total_assets"] - df["sum_asset_components"]
+    df["other_liabilities_plug"] = df["total_liabilities"] - df["sum_liability_components"]
+    df["expendable_net_assets_with_donor_restrictions"] = df["net_assets_with_donor_restrictions"] - df["perpetual_net_assets_with_donor_restrictions"]
+    return df
+
+
+# Extracted columns add_plug_accounts reads
+INPUT_COLUMNS = sorted(set(itertools.chain(*PAIRS_TO_RECONCILE.values(), NET_RECEIVABLES_COMPONENTS, [
+    "all_receivables", "pension_liability", "opeb_liability",
+    "accumulated_depreciation_bs", "accumulated_depreciation_notes",
+    "accumulated_amortization_bs", "accumulated_amortization_notes",
+    "long_term_investments", "cash_surrender_value_life_insurance",
+    "deferred_revenue_raw", "student_tuition_and_deposits", "student_credit_balances_and_deposits",
+    "asset_retirement_obligations", "all_deferred_revenue",
+    "long_term_debt_labeled", "other_long_term_debt_obligations", "backup_total_long_term_debt",
+    "net_fixed_assets_raw", "total_assets", "total_liabilities",
+    "net_assets_with_donor_restrictions", "perpetual_net_assets_with_donor_restrictions",
+    "cash_and_short_term_investments_unrestricted_and_restricted", "short_term_debt",
+    "current_portion_finance_lease", "current_portion_long_term_debt", "current_portion_operating_lease",
+    "accounts_payable", "swap_obligation_fmv",
+])) - set(PAIRS_TO_RECONCILE))
+
+
+def sample_extractions(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    `n` made-up school-years shaped like the extraction output: whole-dollar figures, about a third
+    missing, and the balance-sheet / notes pairs often equal, so every branch of the reconciliation is hit.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.choice([0.0, 1e3, 2.5e5, 4e6, 1.25e7, 3e8], size=(n, len(INPUT_COLUMNS)))
+    values = values + rng.integers(0, 3, size=values.shape) * 1e3
+    values[rng.random(values.shape) < 0.35] = np.nan
+    df = pd.DataFrame(values, columns=INPUT_COLUMNS)
+    for bs, notes in PAIRS_TO_RECONCILE.values():
+        same = rng.random(n) < 0.4
+        df.loc[same, notes] = df.loc[same, bs]
+    same = rng.random(n) < 0.4
+    df.loc[same, "student_tuition_and_deposits"] = df.loc[same, "deferred_revenue_raw"]
+    df.index = pd.MultiIndex.from_arrays([[f"SCHOOL_{i // 3}" for i in range(n)],
+                                          [f"file_{i % 3}.pdf" for i in range(n)]], names=["school", "file"])
+    return df
+
+
+@pytest.fixture(params=[1, 7, 500, 5000])
+def extractions(request) -> pd.DataFrame:
+    return sample_extractions(request.param, seed=request.param)
+
+
+def test_add_plug_accounts_matches_rowwise(extractions):
+    """Same output columns as the notebook version: values and dtypes, NaN in the same places."""
+    expected = add_plug_accounts_rowwise(extractions.copy())
+    got = add_plug_accounts(extractions.copy())
+    pd.testing.assert_frame_equal(got, expected)
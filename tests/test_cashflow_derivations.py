@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cashflow_derivations import derive, extracted_inputs, filled_table
+
+
+def derive_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    """The notebook's row-by-row computations (reference for derive), on a copy of `df`."""
+    df_values = df.copy()
+
+    df_values["other_changes_in_investment_activities"] = df_values[
+        "other_changes_in_investment_activities_calculated"
+    ]
+
+    def compute_operating_changes(row):
+        net_cash = row["net_cash_from_operating_activities"]
+        net_assets = row["total_change_in_net_assets"]
+        non_cash = row["total_non_cash_exp"]
+        working_cap = row["change_in_working_capital"]
+
+        return (0 if pd.isna(net_cash) else net_cash) - (
+            (0 if pd.isna(net_assets) else net_assets) +
+            (0 if pd.isna(non_cash) else non_cash) +
+            (0 if pd.isna(working_cap) else working_cap)
+        )
+
+    df_values["other_changes_in_operating_activities"] = df_values.apply(
+        compute_operating_changes, axis=1
+    )
+
+    # The notebook assigns this to the two-level `df` it read from Excel (a KeyError); df_values is meant
+    df_values["long_term_debt_principal_payments"] = (
+        (df_values["long_term_debt_principal_payments"].fillna(0))
+        + (df_values["payments_on_lease_liabilities"].fillna(0))
+    )
+
+    def compute_change_in_long_term_debt(row):
+        proceeds = row["long_term_debt_net_proceeds"]
+        payments = row["long_term_debt_principal_payments"]
+        return (0 if pd.isna(proceeds) else proceeds) + (0 if pd.isna(payments) else payments)
+
+    df_values["change_in_long_term_debt"] = df_values.apply(compute_change_in_long_term_debt, axis=1)
+
+    df_values["other_changes_in_financing_activities"] = (
+        df_values["net_cash_from_financing_activities"] - df_values["change_in_long_term_debt"]
+    )
+    return df_values
+
+
+INPUT_COLUMNS = extracted_inputs()
+
+
+def sample_cash_flows(n: int, seed: int = 0) -> pd.DataFrame:
+    """`n` made-up school-years in USD 1,000 (fractional, as scaled at extraction), about a quarter missing."""
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.normal(0, 5e4, size=(n, len(INPUT_COLUMNS))), 3)
+    values[rng.random(values.shape) < 0.25] = np.nan
+    return pd.DataFrame(values, columns=INPUT_COLUMNS, index=pd.Index([f"SCHOOL_{i}" for i in range(n)], name="School"))
+
+
+@pytest.fixture(params=[1, 7, 500, 5000])
+def cash_flows(request) -> pd.DataFrame:
+    return sample_cash_flows(request.param, seed=request.param)
+
+
+def test_derive_matches_rowwise(cash_flows):
+    pd.testing.assert_frame_equal(derive(cash_flows), derive_rowwise(cash_flows), check_names=False)
+
+
+def test_filled_table_column_order(cash_flows):
+    table = filled_table(cash_flows, "2024")
+    assert list(table.columns[:4]) == ["Year", "total_change_in_net_assets", "total_non_cash_exp",
+                                       "change_in_working_capital"]
+    assert (table["Year"] == "2024").all()
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from consensus import consensus, safe_mode
+
+
+def sample_runs(schools: int, runs: int = 3, metrics: int = 40, seed: int = 0) -> pd.DataFrame:
+    """
+    Made-up extraction runs: `runs` rows per school (one or two files each), figures that agree,
+    nearly agree (within 0.5% / 3%), disagree or are missing, so every rule is exercised.
+    """
+    rng = np.random.default_rng(seed)
+    files = rng.integers(1, 3, size=schools)
+    school = np.repeat([f"SCHOOL_{i}" for i in range(schools)], files * runs)
+    n = len(school)
+    base = np.repeat(rng.choice([1e5, 2.5e6, 4e7, -3e6], size=(schools, metrics)), files * runs, axis=0)
+    noise = rng.choice([0.0, 0.0, 0.004, 0.03, 0.2], size=(n, metrics))
+    values = np.round(base * (1 + noise * rng.integers(-1, 2, size=(n, metrics))))
+    values[rng.random((n, metrics)) < 0.2] = np.nan
+    df = pd.DataFrame(values, columns=[f"metric_{j}" for j in range(metrics)])
+    df.insert(0, "school", school)
+    df["year"] = 2024
+    df["RowType"] = "data"
+    return df
+
+
+@pytest.fixture(params=[1, 20, 300])
+def runs(request) -> pd.DataFrame:
+    return sample_runs(request.param, seed=request.param)
+
+
+def test_consensus_matches_safe_mode(runs):
+    expected = runs.groupby(["school"], dropna=False).agg(safe_mode)
+    pd.testing.assert_frame_equal(consensus(runs, "school"), expected)
+
+
+def test_consensus_in_chunks_matches_safe_mode(monkeypatch):
+    monkeypatch.setattr("consensus.CHUNK_CELLS", 1000)   # a few schools per comparison block
+    runs = sample_runs(20, seed=5)
+    expected = runs.groupby(["school"], dropna=False).agg(safe_mode)
+    pd.testing.assert_frame_equal(consensus(runs, "school"), expected)
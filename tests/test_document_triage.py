@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from document_triage import DocumentTriage, flag_training_rows, size_hint_kb, triage_features, year_end_month
+from pdf_downloader import slugify
+
+LIST_COLUMNS = ["CUSIP", "subgroup", "document_name", "pdf_url", "period_date", "posted_date", "CREDIT"]
+
+DOCUMENTS = [
+    # (subgroup, document_name, period_date as in the full list)
+    ("Annual Financial Information", "Annual Report for the year ended 06/30/2024 (288 KB)", "06/30/2024"),
+    ("Audited Financial Statements or ACFR", "Audited Financial Statements 2024 Document2 (1.2 MB)", "05/31/2024"),
+    (None, "Annual Financial Disclosures Posted 01/17/2025 for the year ended 06/30/2024 (160 KB)", None),
+    (None, "Official Statement - FINAL OS (6.6 MB)", None),
+]
+
+
+@pytest.fixture
+def disclosure_lists(tmp_path):
+    """The scraper's two lists of the same documents: period_date MM/DD/YYYY in the full one, ISO in the filtered one."""
+    rows = [{"CUSIP": "123456AB", "subgroup": sg, "document_name": name, "pdf_url": f"https://emma.msrb.org/P{i}.pdf",
+             "period_date": period, "posted_date": "01/17/2025", "CREDIT": "EXAMPLE UNIVERSITY/THE"}
+            for i, (sg, name, period) in enumerate(DOCUMENTS)]
+    full = pd.DataFrame(rows, columns=LIST_COLUMNS)
+    filtered = full.assign(period_date=pd.to_datetime(full["period_date"], format="%m/%d/%Y").dt.strftime("%Y-%m-%d"))
+    full.to_csv(tmp_path / "disclosure_document_list_all.csv", index=False)
+    filtered.to_csv(tmp_path / "disclosure_document_list_filtered.csv", index=False)
+    flags = pd.DataFrame({
+        "school": slugify("EXAMPLE UNIVERSITY/THE"),
+        "document": [f"university_pdfs/{slugify('EXAMPLE UNIVERSITY/THE')}/{slugify(name)}.pdf" for _, name, _ in DOCUMENTS],
+        "Other_3": [False, False, False, True],
+    })
+    flags.to_csv(tmp_path / "flags.csv", index=False)
+    return tmp_path
+
+
+def test_training_and_inference_features_are_identical(disclosure_lists):
+    train = flag_training_rows(str(disclosure_lists / "flags.csv"),
+                               [str(disclosure_lists / "disclosure_document_list_all.csv")])
+    assert train["subgroup"].notna().sum() == 2
+    at_inference = pd.read_csv(disclosure_lists / "disclosure_document_list_filtered.csv", dtype=str)
+    for t, d in zip(train.itertuples(index=False), at_inference.to_dict("records")):
+        assert triage_features(t.document_name, t.subgroup, t.period_date) == \
+            triage_features(d["document_name"], d["subgroup"], d["period_date"])
+
+
+def test_features_without_metadata_match_those_with_it():
+    name = "Annual Report for the year ended 06/30/2024 (288 KB)"
+    assert triage_features(slugify(name)) == triage_features(name, None, "2024-06-30")
+    assert "fye:6" in triage_features(name, None, "06/30/2024")
+
+
+@pytest.mark.parametrize("name, period_date, month", [
+    ("x", "2024-06-30", 6),
+    ("x", "05/31/2024", 5),
+    ("Annual Financial Disclosures Posted 01/17/2025 for the year ended 06/30/2024 (160 KB)", None, 6),
+    ("Appendix_A_for_Year_Ending_08.31.24_Document2__109_KB_", None, 8),
+    ("Planned Financings dated 03/27/2025 (67 KB)", None, 3),
+    ("Official Statement - FINAL OS (6.6 MB)", None, None),
+    ("x", "Details", None),
+])
+def test_year_end_month(name, period_date, month):
+    assert year_end_month(name, period_date) == month
+
+
+def test_triage_of_a_row_without_document_name(disclosure_lists):
+    triage = DocumentTriage.from_flags(str(disclosure_lists / "flags.csv"),
+                                       [str(disclosure_lists / "disclosure_document_list_all.csv")])
+    docs = pd.read_csv(disclosure_lists / "disclosure_document_list_filtered.csv", dtype=str)
+    docs.loc[len(docs)] = {"CUSIP": "123456AB", "document_name": np.nan, "CREDIT": "EXAMPLE UNIVERSITY/THE"}
+    out = triage.triage(docs)
+    assert len(out) == len(docs)
+    assert np.isnan(out["size_kb"].iloc[-1])
+    assert size_hint_kb(np.nan) is None
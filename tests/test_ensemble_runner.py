@@ -0,0 +1,74 @@
+import os
+import zlib
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from consensus import AGREE_ALL, consensus
+from ensemble_runner import MAX_RUNS, MIN_RUNS, run_ensemble, run_frame, settled_schools
+from extraction_cache import CachedRun
+from extraction_engine import extract_jobs, school_jobs
+
+
+def simulated_extract(stable_share: float = 0.6, seed: int = 0) -> Callable[[int], Callable[[str], CachedRun]]:
+    """
+    extract_for_run for made-up extractions: per file, a share of the columns always come out the same,
+    the others vary per run (by 0, 0.5%, 3% or 20%), and some are never found. Files of a `stable_share`
+    of the schools always come out the same.
+    """
+    def for_run(run: int) -> Callable[[str], CachedRun]:
+        def extract(path: str) -> CachedRun:
+            key = zlib.crc32(f"{seed}:{os.path.relpath(path, os.path.dirname(os.path.dirname(path)))}".encode())
+            rng = np.random.default_rng(key)
+            base = rng.choice([1e5, 2.5e6, 4e7, -3e6], size=12)
+            missing = rng.random(12) < 0.2
+            stable = rng.random() < stable_share
+            noise = np.random.default_rng([key, run]).choice([0.0, 0.0, 0.005, 0.03, 0.2], size=12)
+            sign = np.random.default_rng([key, run, 1]).integers(-1, 2, size=12)
+            values = np.round(base * (1 + (0 if stable else noise * sign)))
+            data = {f"metric_{j}": (None if missing[j] else float(values[j])) for j in range(12)}
+            data["year"] = 2024
+            return CachedRun(data, None)
+        return extract
+    return for_run
+
+
+@pytest.fixture
+def pdf_root(tmp_path) -> str:
+    """60 school folders of one or two (empty) PDFs each."""
+    rng = np.random.default_rng(0)
+    for i in range(60):
+        school = tmp_path / f"SCHOOL_{i:02d}"
+        school.mkdir()
+        for f in range(rng.integers(1, 3)):
+            (school / f"file_{f}.pdf").touch()
+    return str(tmp_path)
+
+
+def test_consensus_matches_the_full_vote(pdf_root):
+    """With the default (exact) agreement, stopping early must not change any school's consensus."""
+    for_run = simulated_extract()
+    result = run_ensemble(for_run, pdf_root, max_workers=4)
+    jobs = school_jobs(pdf_root)
+    full = pd.concat([run_frame(extract_jobs(for_run(run), jobs, 4), run) for run in range(1, MAX_RUNS + 1)],
+                     ignore_index=True)
+    expected = consensus(full.drop(columns=["run", "file"]), by="school")
+    pd.testing.assert_frame_equal(result.consensus, expected, check_dtype=False)
+
+    settled_early = result.runs_per_school < MAX_RUNS
+    assert settled_early.any() and not settled_early.all()
+    assert result.full_extractions == len(jobs) * MAX_RUNS
+    assert result.extractions < result.full_extractions
+    assert (result.runs_per_school >= MIN_RUNS).all()
+
+
+def test_near_agreement_only_settles_with_a_tolerance():
+    runs = pd.DataFrame({"run": [1, 2, 1, 2], "school": ["A", "A", "B", "B"], "file": "f.pdf",
+                         "total_assets": [100.0, 100.5, 250.0, 250.0], "notes": [None, None, "x", "x"]})
+    assert settled_schools(runs).to_dict() == {"A": False, "B": True}
+    assert settled_schools(runs, AGREE_ALL).to_dict() == {"A": True, "B": True}
+    # Settled that way, A's consensus is the last run's value rather than the one a third run would confirm
+    voted = consensus(runs.drop(columns=["run", "file"]), by="school")
+    assert voted.loc["A", "total_assets"] == 100.5
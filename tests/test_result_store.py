@@ -0,0 +1,30 @@
+import pandas as pd
+
+from result_store import ResultStore, as_rows
+
+
+def rows(schools, statement="cash_flows", fiscal_year=2024, run_id="1"):
+    return as_rows(pd.DataFrame([{"school": s, "fiscal_year": fiscal_year, "statement": statement, "metric": "m",
+                                  "value": 1.0, "run_id": run_id} for s in schools]))
+
+
+def stored(store):
+    return sorted(store.read()[["statement", "run_id", "school"]].itertuples(index=False, name=None))
+
+
+def test_write_replaces_the_whole_batch(tmp_path):
+    store = ResultStore(str(tmp_path / "results.parquet"))
+    store.write(rows(["A", "B"]), "cash_flows", 2024)
+    store.write(rows(["A"], statement="balance_sheet"), "balance_sheet", 2024)
+    store.write(rows(["A"], run_id="2"), "cash_flows", 2024, "2")
+    # B has no data in the rerun: its old rows must not survive
+    store.write(rows(["A", "C"]), "cash_flows", 2024)
+    assert stored(store) == [("balance_sheet", "1", "A"), ("cash_flows", "1", "A"), ("cash_flows", "1", "C"),
+                             ("cash_flows", "2", "A")]
+
+
+def test_write_of_a_run_without_data_clears_its_batch(tmp_path):
+    store = ResultStore(str(tmp_path / "results.parquet"))
+    store.write(rows(["A", "B"]), "cash_flows", 2024)
+    store.write(rows([]), "cash_flows", 2024)
+    assert stored(store) == []
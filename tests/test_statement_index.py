@@ -0,0 +1,42 @@
+import shutil
+
+import pytest
+
+import page_selector
+from statement_index import StatementIndex
+
+PAGES = 12
+
+
+@pytest.fixture
+def page_texts(monkeypatch):
+    """Page text of every test PDF: a balance sheet on pages 3 and 8, activities on page 5, filler elsewhere."""
+    texts = ["Notes to the financial statements"] * PAGES
+    texts[3] = "Statements of Financial Position\ntotal assets 1,234,000 total liabilities 567,000 total net assets 667,000"
+    texts[8] = "Balance Sheets\ntotal assets 2,000 total liabilities 1,000"
+    texts[5] = "Statements of Activities\ntotal revenues 4,500,000 total expenses 4,100,000 change in net assets 400,000"
+    monkeypatch.setattr(page_selector, "extract_page_texts", lambda pdf_path, pages=None: list(texts))
+
+
+def test_copies_of_a_document_share_one_set_of_pages(tmp_path, page_texts):
+    first = tmp_path / "pdfs" / "SCHOOL_A" / "acfr.pdf"
+    first.parent.mkdir(parents=True)
+    first.write_bytes(b"%PDF-1.4 the same document")
+    index = StatementIndex(str(tmp_path / "index.parquet"))
+    index.build(str(tmp_path / "pdfs"))
+    single = index.best_pages(str(first), "financial_position", top_k=2)
+
+    # Copies added later are aliases of the indexed document (the hard-link dedupe case)
+    for school in ("SCHOOL_B", "SCHOOL_C"):
+        copy = tmp_path / "pdfs" / school / "acfr.pdf"
+        copy.parent.mkdir()
+        shutil.copy(first, copy)
+        index.build(str(tmp_path / "pdfs"))
+
+    scores = index.scores(str(first))
+    assert len(scores) == PAGES
+    assert scores.index.is_unique
+    assert len(index.df) == 3 * PAGES   # every copy keeps its own rows for locate()
+    assert index.best_pages(str(tmp_path / "pdfs" / "SCHOOL_C" / "acfr.pdf"), "financial_position", top_k=2) == single
+    # Reloaded from disk, too
+    assert len(StatementIndex(str(tmp_path / "index.parquet")).scores(str(first))) == PAGES